@@ -1,21 +1,47 @@
 import asyncio
-from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from contextlib import asynccontextmanager, nullcontext
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .session.actions import delete_expired_sessions
-from .routes import upload, pixel, command, measurements, session
+from .session.actions import delete_expired_sessions, get_session_from_cookie
+from .services.chunked_upload import delete_expired_uploads
+from .routes import upload, pixel, command, measurements, session, jobs, export, debug, batch
+from .services.jobs import scheduler
+from .services.dataset_cache import dataset_in_use, remove_scratch_dirs
+from .services.encoding import ARRAY_HEADERS
+from .services.covariance import COVARIANCE_HEADERS
+from .services.frame_sequence import SEQUENCE_HEADERS
+from .services.memory import memory_manager
+from .services.profiling import RequestProfile, profiling_requested
+from .services.warmup import warmup
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async def cleanup_loop():
         while True:
             await delete_expired_sessions()
+            delete_expired_uploads()
             await asyncio.sleep(600)  # Run every 10 minutes
 
+    # Background jobs fill caches while no request arrives, so memory is also checked periodically
+    async def memory_loop():
+        while True:
+            await run_in_threadpool(memory_manager.check)
+            await asyncio.sleep(10)
+
     task = asyncio.create_task(cleanup_loop())
+    memory_task = asyncio.create_task(memory_loop())
+    scheduler.start()
+    # Heavy imports happen here, on a threadpool worker, while the server already answers /ready
+    warmup_task = asyncio.create_task(run_in_threadpool(warmup.run))
 
     yield  # App is running here
 
+    scheduler.shutdown()
+    remove_scratch_dirs()
+    warmup_task.cancel()
+    memory_task.cancel()
     task.cancel()
     try:
         await task
@@ -31,6 +57,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Disposition", "X-Profile-Report", *ARRAY_HEADERS, *COVARIANCE_HEADERS, *SEQUENCE_HEADERS],
 )
 
 app.include_router(upload.router)
@@ -38,7 +65,41 @@ app.include_router(pixel.router)
 app.include_router(measurements.router)
 app.include_router(command.router)
 app.include_router(session.router)
+app.include_router(jobs.router)
+app.include_router(export.router)
+app.include_router(debug.router)
+app.include_router(batch.router)
+
+# Background jobs only start while no interactive request is in flight
+@app.middleware("http")
+async def prioritise_interactive_requests(request: Request, call_next):
+    if request.url.path.startswith("/jobs") or request.url.path == "/ready":
+        return await call_next(request)
+    with scheduler.interactive():
+        return await call_next(request)
+
+# Caches are released when memory runs short instead of collecting after every request;
+# requests sent with X-Profile get an allocation and CPU report when profiling is enabled
+@app.middleware("http")
+async def manage_memory(request: Request, call_next):
+    # The session's dataset is kept from being released while its request runs
+    session = await get_session_from_cookie(request)
+    with dataset_in_use(session.file_path) if session is not None and session.file_path else nullcontext():
+        if profiling_requested(request):
+            with RequestProfile(request) as profile:
+                response = await call_next(request)
+            response.headers["X-Profile-Report"] = profile.name
+        else:
+            response = await call_next(request)
+    if memory_manager.due():
+        await run_in_threadpool(memory_manager.check)
+    return response
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the AOTrack Backend"}
+
+# Readiness probe: 503 until the startup warm-up has finished
+@app.get("/ready")
+def read_ready():
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready.is_set() else 503)
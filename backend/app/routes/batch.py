@@ -0,0 +1,101 @@
+import asyncio
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..session.actions import get_session_from_cookie
+from ..services.dataset import KINDS, open_dataset
+from .pixel import pixel_basic_stats, pixel_meta, pixel_default_stats
+from .measurements import slope_basic_stats, slope_meta, slope_default_stats
+from .command import command_basic_stats, command_meta, command_default_stats
+
+router = APIRouter()
+
+# Items computed at once; each default-stats median holds a full copy of its data
+BATCH_CONCURRENCY = 2
+
+# Min/max/mean pass shared by the quantities of one item
+BASIC_STATS = {"pixel": pixel_basic_stats, "slope": slope_basic_stats, "command": command_basic_stats}
+
+# Quantity name -> function(file_path, index, basic) for each data kind
+QUANTITIES = {
+    "pixel": {"meta": pixel_meta, "default_stats": pixel_default_stats},
+    "slope": {"meta": slope_meta, "default_stats": slope_default_stats},
+    "command": {"meta": command_meta, "default_stats": command_default_stats},
+}
+
+def parse_index_list(value: str, count: int) -> list[int]:
+    """
+    Sensor or loop indices from "all" or a comma separated list such as "0,2".
+    """
+    if value.strip() == "all":
+        return list(range(count))
+    try:
+        return [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid index list: {value}")
+
+def batch_item(file_path: str, kind: str, index: int, quantities: list[str]) -> dict:
+    """
+    Every requested quantity of one sensor or loop, computed back to back on one worker
+    so its data is read while still hot; min, max and mean are reduced once and shared.
+    Failures are reported per item.
+    """
+    item = {"index": index}
+    try:
+        basic = BASIC_STATS[kind](open_dataset(file_path).data(kind, index))
+    except Exception as e:
+        # Each quantity then reads the data itself and reports its own error
+        print(f"Batch basic stats error: {e}")
+        basic = None
+    for quantity in quantities:
+        try:
+            item[quantity] = QUANTITIES[kind][quantity](file_path, index, basic)
+        except HTTPException as e:
+            item.setdefault("errors", {})[quantity] = e.detail
+    return item
+
+# Meta and default stats of several sensors and loops in one request, e.g.
+# pixel=all&slope=0,1&command=0&quantities=meta,default_stats
+@router.post("/batch")
+async def get_batch(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    quantities = [q.strip() for q in form.get("quantities", "meta,default_stats").split(",") if q.strip()]
+    for quantity in quantities:
+        if quantity not in QUANTITIES["pixel"]:
+            raise HTTPException(status_code=400, detail=f"Invalid quantity: {quantity}")
+
+    try:
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
+    except Exception as e:
+        print(f"Batch error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to open dataset")
+    counts = {"pixel": len(system.wavefront_sensors), "slope": len(system.wavefront_sensors), "command": len(system.loops)}
+
+    requested = [
+        (kind, index)
+        for kind in KINDS if form.get(kind)
+        for index in parse_index_list(form.get(kind), counts[kind])
+    ]
+    for kind, index in requested:
+        if not (0 <= index < counts[kind]):
+            raise HTTPException(status_code=400, detail=f"{kind} index {index} out of range")
+
+    # Sensors and loops run in parallel on the threadpool, at most BATCH_CONCURRENCY at a
+    # time; numpy releases the GIL in the reductions
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run_item(kind: str, index: int) -> dict:
+        async with limit:
+            return await run_in_threadpool(batch_item, session.file_path, kind, index, quantities)
+
+    items = await asyncio.gather(*(run_item(kind, index) for kind, index in requested))
+
+    response = {kind: [] for kind in KINDS if form.get(kind)}
+    for (kind, _), item in zip(requested, items):
+        response[kind].append(item)
+    return JSONResponse(response)
@@ -1,10 +1,25 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import numpy as np
 from ..session.actions import get_session_from_cookie
-from ..utils import process_frame
-import aotpy
-import gc
+from ..session.manager import SessionData
+from ..services.http_cache import cacheable_response
+from ..services.dataset import open_dataset
+from ..services.dataset_cache import get_or_compute, scratch_dir
+from ..services.prefix_index import build_prefix_index
+from ..services.tile_cache import serve_tile
+from ..services.ingestion import register_ingestion_step
+from ..services.encoding import array_response
+from ..services.binning import parse_frame_window
+from ..services.covariance import serve_covariance
+from ..services.modal import get_projection, modal_coefficients, modal_variance, parse_modal_form, bucket_mean
+from ..services.latency import DEFAULT_MAX_LAG, SIGNALS, get_latency
+from ..services.frame_sequence import serve_frame_sequence
+from ..services.zone_map import build_zone_map, search_payload
+from ..services.frame_summary import build_frame_summary, frame_summary_payload
+from ..services.stat_maps import STAT_NAMES, actuator_cells, compute_stat_maps, scatter_to_grid
+from ..utils import process_frame, nan_to_none, parse_indices
 
 router = APIRouter()
 
@@ -15,12 +30,19 @@ async def get_command_frame(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
+    return await _command_frame(request, session, form)
 
+@router.get("/command/get-frame")
+async def get_command_frame_cacheable(request: Request):
+    return await cacheable_response(request, _command_frame)
+
+async def _command_frame(request: Request, session: SessionData, form):
     loop_index = int(form.get("index", 0))
     frame_index = int(form.get("frame_index", 0))
+    window = parse_frame_window(form)
 
     try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
         
         loops = system.loops
         if not (0 <= loop_index < len(loops)): 
@@ -28,7 +50,8 @@ async def get_command_frame(request: Request):
 
         loop = loops[loop_index]
         corrector = loop.commanded_corrector
-        influence_function = corrector.influence_function.data
+        # Only the surface inside the region of interest is reconstructed
+        influence_function = window.crop(corrector.influence_function.data)
         n_actuators, x, y = influence_function.shape
         influence_matrix = influence_function.reshape(n_actuators, x * y)
         
@@ -39,18 +62,15 @@ async def get_command_frame(request: Request):
 
         command_vector = commands[frame_index]
         image_flat = command_vector @ influence_matrix
-        image_2d = image_flat.reshape(x, y)
-        safe_array = [
-            [None if np.isnan(x) else x for x in row]
-            for row in image_2d.tolist()
-        ]
-        del system
-        gc.collect()
+        image_2d = window.bin(image_flat.reshape(x, y))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"AOSystem error: {e}")
         raise HTTPException(status_code=500, detail="Failed to load frame")
     
-    return JSONResponse({"frame": safe_array})
+    # The reconstructed surface has no precomputed dataset range, so quantization uses the frame's own
+    return array_response(request, form, {"frame": image_2d})
 
 @router.post("/command/tile")
 async def get_flat_tile_post(request: Request):
@@ -59,45 +79,14 @@ async def get_flat_tile_post(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
-    frame_start = int(form.get("frame_start"))
-    frame_end = int(form.get("frame_end"))
-    index_start = int(form.get("index_start"))
-    index_end = int(form.get("index_end"))
-    loop_index = int(form.get("index", 0))
-
-    if frame_end <= frame_start:
-        raise HTTPException(status_code=400, detail="Invalid frame range")
-    if index_end <= index_start:
-        raise HTTPException(status_code=400, detail="Invalid index range")
-
-    try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
-        
-        loops = system.loops
-        if not (0 <= loop_index < len(loops)): 
-            raise HTTPException(status_code=400, detail=f"loop_index {loop_index} out of range")
-
-        loop = loops[loop_index]
-        
-        commands = loop.commands.data
-        n_frames = commands.shape[0]
-        n_indexes = commands.shape[1]
-
-        frame_end = min(frame_end, n_frames)
-        index_end = min(index_end, n_indexes)
-
-        sliced = commands[frame_start:frame_end, index_start:index_end]
+    return await _command_tile(request, session, form)
 
-        del system
-        gc.collect()
+@router.get("/command/tile")
+async def get_flat_tile_cacheable(request: Request):
+    return await cacheable_response(request, _command_tile)
 
-        return JSONResponse({
-            "tile": np.array(sliced).tolist(),
-        })
-
-    except Exception as e:
-        print(f"Tile fetch error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to extract tile")
+async def _command_tile(request: Request, session: SessionData, form):
+    return await serve_tile(request, session.file_path, "command", form)
     
 @router.post("/command/get-meta")
 async def get_command_meta(request: Request):
@@ -106,13 +95,28 @@ async def get_command_meta(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
+    return JSONResponse(await _command_meta(request, session, form))
+
+@router.get("/command/get-meta")
+async def get_command_meta_cacheable(request: Request):
+    return await cacheable_response(request, _command_meta)
+
+async def _command_meta(request: Request, session: SessionData, form) -> dict:
     try:
         loop_index = int(form.get("loop_index", 0))
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid loop format")
+    return await run_in_threadpool(command_meta, session.file_path, loop_index)
+
+def command_basic_stats(data: np.ndarray) -> dict:
+    """
+    Min, max and mean of the commands, shared by meta and default stats in a batch.
+    """
+    return {"min": float(np.min(data)), "max": float(np.max(data)), "mean": float(np.mean(data))}
 
+def command_meta(file_path: str, loop_index: int, basic: dict | None = None) -> dict:
     try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = open_dataset(file_path).system
         loops = system.loops
         if not (0 <= loop_index < len(loops)): 
             raise HTTPException(status_code=400, detail=f"loop_index {loop_index} out of range")
@@ -124,8 +128,8 @@ async def get_command_meta(request: Request):
         commands = loop.commands.data
         
         num_frames, num_index = commands.shape
-        overall_min = float(np.min(commands))
-        overall_max = float(np.max(commands))
+        overall_min = basic["min"] if basic else float(np.min(commands))
+        overall_max = basic["max"] if basic else float(np.max(commands))
         
         if hasattr(corrector, "influence_function") and corrector.influence_function is not None:
             influence_function = corrector.influence_function.data
@@ -146,9 +150,6 @@ async def get_command_meta(request: Request):
             "col_row_to_index": col_row_to_index.tolist(),
             "index_to_col_row": index_to_col_row
             }
-        
-        del system
-        gc.collect()
 
         response = {
             "num_frames": num_frames,
@@ -161,7 +162,7 @@ async def get_command_meta(request: Request):
             response["num_cols"] = num_cols
             response["lookup"] = lookup_payload
             
-        return JSONResponse(response)
+        return response
     except Exception as e:
         print(f"Meta error: {e}")
         raise HTTPException(status_code=500, detail="Failed to extract metadata")
@@ -173,21 +174,29 @@ async def get_default_values(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
+    return JSONResponse(await _command_default_stats(request, session, form))
+
+@router.get("/command/get-default-stats")
+async def get_default_values_cacheable(request: Request):
+    return await cacheable_response(request, _command_default_stats)
+
+async def _command_default_stats(request: Request, session: SessionData, form) -> dict:
     loop_index = int(form.get("index", 0))
+    return await run_in_threadpool(command_default_stats, session.file_path, loop_index)
 
+def command_default_stats(file_path: str, loop_index: int, basic: dict | None = None) -> dict:
     try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = open_dataset(file_path).system
         data = system.loops[loop_index].commands.data
-        del system
-        gc.collect()
-        return JSONResponse({
-            "min": float(np.min(data)),
-            "max": float(np.max(data)),
-            "mean": float(np.mean(data)),
+        basic = basic or command_basic_stats(data)
+        return {
+            "min": basic["min"],
+            "max": basic["max"],
+            "mean": basic["mean"],
             "median": float(np.median(data)),
             "std": float(np.std(data)),
             "variance": float(np.var(data)),
-        })
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Histogram error: {e}")
 
@@ -206,7 +215,7 @@ async def get_command_point_timeseries(request: Request):
         col = int(form.get("point_col"))
         row = int(form.get("point_row"))
         
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
         print(system)
         loop = system.loops[loop_index]
         print(loop)
@@ -223,10 +232,7 @@ async def get_command_point_timeseries(request: Request):
         pixel_index = col * x + row
         pixel_vector = influence_matrix[:, pixel_index]
         pixel_timeseries = commands @ pixel_vector
-        
-        del system
-        gc.collect()
-        
+
         contrib_stats = {
             "min": float(np.min(pixel_timeseries)),
             "max": float(np.max(pixel_timeseries)),
@@ -263,7 +269,7 @@ async def get_command_point_contributions(request: Request):
         row = int(form.get("point_row"))
         frame_index = int(form.get("frame_index", 0))
         
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
         loop = system.loops[loop_index]
         corrector = loop.commanded_corrector
         influence_function = corrector.influence_function.data
@@ -271,10 +277,7 @@ async def get_command_point_contributions(request: Request):
         frame_commands = commands[frame_index]
         pixel_influence = influence_function[:, col, row]
         contributions = frame_commands * pixel_influence
-        
-        del system
-        gc.collect()
-        
+
         line_data = [{"x": int(i), "y": float(v)} for i, v in enumerate(contributions)]
 
         return JSONResponse({
@@ -300,12 +303,10 @@ async def get_command_actuator_timeseries(request: Request):
         loop_index = int(form.get("index", 0))
         actuator_index = int(form.get("actuator_index", 0))
         
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
         loop = system.loops[loop_index]
         commands = loop.commands.data
         line_vals = commands[:, actuator_index]
-        del system
-        gc.collect()
 
         stats = {
             "min": float(np.min(line_vals)),
@@ -341,7 +342,7 @@ async def get_command_actuator_contribution(request: Request):
         actuator_index = int(form.get("actuator_index", 0))
         frame_index = int(form.get("frame_index", 0))
         
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
         loop = system.loops[loop_index]
         corrector = loop.commanded_corrector
         influence_function = corrector.influence_function.data
@@ -352,8 +353,6 @@ async def get_command_actuator_contribution(request: Request):
             [float(x) if not np.isnan(x) else None for x in row]
             for row in contribution_map
         ]
-        del system
-        gc.collect()
 
         return JSONResponse({
             "point_vals": clean_contributions,
@@ -362,4 +361,297 @@ async def get_command_actuator_contribution(request: Request):
 
     except Exception as e:
         print(f"Exception occurred: {e}")
-        raise HTTPException(status_code=500, detail=f"Point stats error: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Point stats error: {e}")
+
+# Per-actuator min, max, mean, std and rms over every frame.
+# With layout=pupil each actuator is placed on the pupil grid where its influence function peaks.
+@router.post("/command/get-stat-maps")
+async def get_command_stat_maps(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        loop_index = int(form.get("index", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid index format")
+
+    layout = form.get("layout", "flat")
+    if layout not in ("flat", "pupil"):
+        raise HTTPException(status_code=400, detail=f"Invalid layout: {layout}")
+
+    def compute():
+        return build_command_stat_maps(session.file_path, open_dataset(session.file_path).system, loop_index)
+
+    try:
+        cached = await run_in_threadpool(get_or_compute, session.file_path, ("stat_maps", "command", loop_index), compute)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Stat maps error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute stat maps")
+
+    stats = cached["stats"]
+    if layout == "flat":
+        return JSONResponse({name: nan_to_none(stats[name]) for name in STAT_NAMES})
+
+    if cached["cells"] is None:
+        raise HTTPException(status_code=400, detail="Corrector has no influence function")
+
+    return JSONResponse({
+        name: nan_to_none(scatter_to_grid(stats[name], cached["grid_shape"], cached["cells"]))
+        for name in STAT_NAMES
+    })
+
+
+# Mean reconstructed surface over the frames [frame_start, frame_end), served from the prefix-sum index.
+# The surface is linear in the commands, so the mean surface is the mean command vector times the
+# influence matrix; the std of the surface is not, so only the mean is offered here.
+@router.post("/command/get-range-frame")
+async def get_command_range_frame(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        loop_index = int(form.get("index", 0))
+        frame_start = int(form.get("frame_start"))
+        frame_end = int(form.get("frame_end"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid index or frame range format")
+
+    stat = form.get("stat", "mean")
+    if stat != "mean":
+        raise HTTPException(status_code=400, detail=f"Invalid stat: {stat}")
+    window = parse_frame_window(form)
+
+    def compute():
+        return build_command_prefix_index(session.file_path, open_dataset(session.file_path).system, loop_index)
+
+    try:
+        cached = await run_in_threadpool(get_or_compute, session.file_path, ("prefix_index", "command", loop_index), compute)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Prefix index error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to build frame index")
+
+    index = cached["index"]
+    frame_end = min(frame_end, index.num_frames)
+    if not (0 <= frame_start < frame_end):
+        raise HTTPException(status_code=400, detail="Invalid frame range")
+
+    command_vector = index.range_mean(frame_start, frame_end)
+    influence_function = window.crop(cached["influence_matrix"].reshape(-1, *cached["shape"]))
+    image_2d = command_vector @ influence_function.reshape(len(command_vector), -1)
+    return JSONResponse({"frame": nan_to_none(window.bin(image_2d.reshape(influence_function.shape[1:])))})
+
+
+# Covariance or correlation matrix of the actuator commands, accumulated over frame chunks
+@router.post("/command/get-covariance")
+async def get_command_covariance(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    return await serve_covariance(request, session.file_path, "command", form)
+
+
+# Zernike or KL coefficients of the commands over a frame range, straight from the cached
+# actuator-to-mode projection; modes are numbered from 1 (Noll order for Zernike)
+@router.post("/command/get-mode-timeseries")
+async def get_mode_timeseries(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    loop_index, basis, n_modes = parse_modal_form(form)
+    try:
+        frame_start = int(form.get("frame_start", 0))
+        frame_end = form.get("frame_end")
+        frame_end = int(frame_end) if frame_end not in (None, "") else None
+        max_points = int(form.get("max_points", 2000))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid frame range or max_points format")
+    if max_points <= 0:
+        raise HTTPException(status_code=400, detail="max_points must be positive")
+    modes = parse_indices(form.get("modes") or f"1-{n_modes}", n_modes + 1)
+    if modes.min() < 1:
+        raise HTTPException(status_code=400, detail="Modes are numbered from 1")
+
+    def compute():
+        commands = get_loop(open_dataset(session.file_path).system, loop_index).commands.data
+        end = commands.shape[0] if frame_end is None else min(frame_end, commands.shape[0])
+        if not (0 <= frame_start < end):
+            raise HTTPException(status_code=400, detail="Invalid frame range")
+        projection = get_projection(session.file_path, loop_index, basis, n_modes)["projection"]
+        if projection.shape[1] < n_modes:
+            raise HTTPException(status_code=400, detail=f"Only {projection.shape[1]} {basis} modes available")
+        coefficients = modal_coefficients(commands, projection[:, modes - 1], frame_start, end)
+        return bucket_mean(coefficients, max_points)
+
+    try:
+        bucket, coefficients = await run_in_threadpool(compute)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Modal error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute modal coefficients")
+
+    return JSONResponse({
+        "basis": basis,
+        "modes": modes.tolist(),
+        "frame_start": frame_start,
+        "bucket_size": bucket,
+        "coefficients": nan_to_none(coefficients.T),
+    })
+
+
+# Variance of each Zernike or KL mode over the recording (modal variance spectrum)
+@router.post("/command/get-modal-variance")
+async def get_modal_variance(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    loop_index, basis, n_modes = parse_modal_form(form)
+
+    try:
+        variance = await run_in_threadpool(modal_variance, session.file_path, loop_index, basis, n_modes)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Modal error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute modal variance")
+
+    return JSONResponse({
+        "basis": basis,
+        "modes": list(range(1, len(variance) + 1)),
+        "variance": nan_to_none(variance),
+    })
+
+
+# Effective slope-to-command delay of a loop from the FFT cross-correlation of its input
+# sensor's slopes with its commands, next to the delay and framerate the file reports
+@router.post("/command/get-loop-latency")
+async def get_loop_latency(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    signal = form.get("signal", "increments")
+    if signal not in SIGNALS:
+        raise HTTPException(status_code=400, detail=f"Invalid signal: {signal}")
+    try:
+        loop_index = int(form.get("index", 0))
+        wfs_index = form.get("wfs_index")
+        wfs_index = int(wfs_index) if wfs_index not in (None, "") else None
+        max_lag = int(form.get("max_lag", DEFAULT_MAX_LAG))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid index or max_lag format")
+    if max_lag < 0:
+        raise HTTPException(status_code=400, detail="max_lag must not be negative")
+
+    try:
+        latency = await run_in_threadpool(get_latency, session.file_path, loop_index, wfs_index, signal, max_lag)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Latency error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to estimate loop latency")
+
+    return JSONResponse({
+        **latency,
+        "lags": latency["lags"].tolist(),
+        "coupling": nan_to_none(latency["coupling"]),
+    })
+
+
+# Per-frame min/max/mean/rms/NaN/saturation strip of a loop, downsampled for the overview, with anomalous frames to jump to
+@router.post("/command/get-frame-summary")
+async def get_command_frame_summary(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        return JSONResponse(await run_in_threadpool(frame_summary_payload, session.file_path, "command", form))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Frame summary error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute frame summary")
+
+
+# Frames and actuators where the command meets a threshold predicate, scanning only the zones whose min/max allow a match
+@router.post("/command/search")
+async def search_command(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        return JSONResponse(await run_in_threadpool(search_payload, session.file_path, "command", form))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Search error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search command data")
+
+
+# Playback run of command surfaces: keyframes plus per-frame sparse or dense deltas of the quantized frames
+@router.post("/command/get-frame-sequence")
+async def get_command_frame_sequence(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    return await serve_frame_sequence(request, session.file_path, "command", form)
+
+
+def get_loop(system, loop_index: int):
+    loops = system.loops
+    if not (0 <= loop_index < len(loops)):
+        raise HTTPException(status_code=400, detail=f"loop_index {loop_index} out of range")
+    return loops[loop_index]
+
+def build_command_stat_maps(file_path: str, system, loop_index: int, progress=None):
+    loop = get_loop(system, loop_index)
+    stats = compute_stat_maps(loop.commands.data, progress)
+    grid_shape = None
+    cells = None
+    corrector = loop.commanded_corrector
+    if getattr(corrector, "influence_function", None) is not None:
+        influence_function = corrector.influence_function.data
+        if influence_function.ndim == 3:
+            grid_shape = influence_function.shape[1:]
+            cells = actuator_cells(influence_function)
+    return {"stats": stats, "grid_shape": grid_shape, "cells": cells}
+
+def build_command_prefix_index(file_path: str, system, loop_index: int, progress=None):
+    loop = get_loop(system, loop_index)
+    influence_function = loop.commanded_corrector.influence_function.data
+    n_actuators, x, y = influence_function.shape
+    index = build_prefix_index(loop.commands.data, scratch_dir(file_path), f"command-{loop_index}", progress, with_std=False)
+    influence_matrix = np.asarray(influence_function, dtype=np.float64).reshape(n_actuators, x * y)
+    return {"index": index, "influence_matrix": influence_matrix, "shape": (x, y)}
+
+def has_commands(loop) -> bool:
+    return getattr(loop, "commands", None) is not None
+
+def has_influence_function(loop) -> bool:
+    return has_commands(loop) and getattr(loop.commanded_corrector, "influence_function", None) is not None
+
+register_ingestion_step("command stat maps", 10, "stat_maps", "command", lambda system: [has_commands(l) for l in system.loops], build_command_stat_maps)
+register_ingestion_step("command frame index", 20, "prefix_index", "command", lambda system: [has_influence_function(l) for l in system.loops], build_command_prefix_index)
+register_ingestion_step("command frame summary", 5, "frame_summary", "command", lambda system: [has_commands(l) for l in system.loops], lambda file_path, system, index, progress: build_frame_summary(file_path, "command", index, progress=progress))
+register_ingestion_step("command zone map", 15, "zone_map", "command", lambda system: [has_commands(l) for l in system.loops], lambda file_path, system, index, progress: build_zone_map(file_path, "command", index, progress))
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from ..session.actions import get_session_from_cookie
+from ..services.memory import memory_manager
+
+router = APIRouter()
+
+# Process memory and the cached arrays of the active session's dataset
+@router.get("/debug/memory")
+async def get_memory(request: Request):
+    session = await get_session_from_cookie(request)
+    file_path = session.file_path if session is not None else None
+    report = memory_manager.report(file_path)
+    if file_path is None:
+        report["datasets"] = []
+    return JSONResponse(report)
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Request, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from ..session.actions import get_session_from_cookie
+from ..services.export import export_response
+
+router = APIRouter()
+
+# Download a frame range x index set of one data kind as .npy, CSV or FITS
+@router.post("/export")
+async def export_data(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    return await run_in_threadpool(export_response, session.file_path, form)
+
+# Same as POST /export with the parameters in the query string, so a plain link can start the download
+@router.get("/export")
+async def export_data_link(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    return await run_in_threadpool(export_response, session.file_path, request.query_params)
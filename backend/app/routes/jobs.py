@@ -0,0 +1,40 @@
+import asyncio
+import json
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from ..session.actions import get_session_from_cookie
+from ..services.jobs import scheduler
+
+router = APIRouter()
+
+# Seconds between progress events on the stream
+STREAM_INTERVAL = 0.5
+
+# Background jobs (validation, stats, indices) of the active session's dataset, for polling
+@router.get("/jobs")
+async def get_jobs(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    return JSONResponse({"jobs": [job.to_dict() for job in scheduler.jobs_for(session.file_path)]})
+
+# Same as /jobs, pushed as server-sent events until every job has finished
+@router.get("/jobs/stream")
+async def stream_jobs(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    file_path = session.file_path
+
+    async def events():
+        while not await request.is_disconnected():
+            jobs = scheduler.jobs_for(file_path)
+            yield f"data: {json.dumps({'jobs': [job.to_dict() for job in jobs]})}\n\n"
+            if all(job.finished for job in jobs):
+                return
+            await asyncio.sleep(STREAM_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,9 +1,23 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import numpy as np
 from ..session.actions import get_session_from_cookie
-import aotpy
-import gc
+from ..session.manager import SessionData
+from ..services.http_cache import cacheable_response
+from ..services.dataset import open_dataset
+from ..services.dataset_cache import get_or_compute, scratch_dir
+from ..services.prefix_index import build_prefix_index
+from ..services.tile_cache import serve_tile
+from ..services.ingestion import register_ingestion_step
+from ..services.encoding import array_response, dataset_value_range, needs_value_range
+from ..services.binning import parse_frame_window
+from ..services.covariance import serve_covariance
+from ..services.frame_sequence import serve_frame_sequence
+from ..services.zone_map import build_zone_map, search_payload
+from ..services.frame_summary import build_frame_summary, frame_summary_payload
+from ..services.stat_maps import STAT_NAMES, compute_stat_maps, scatter_to_grid, subaperture_cells
+from ..utils import nan_to_none
 
 router = APIRouter()
 
@@ -14,12 +28,19 @@ async def get_slope_frame(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
+    return await _slope_frame(request, session, form)
 
+@router.get("/slope/get-frame")
+async def get_slope_frame_cacheable(request: Request):
+    return await cacheable_response(request, _slope_frame)
+
+async def _slope_frame(request: Request, session: SessionData, form):
     wfs_index = int(form.get("index", 0))
     frame_index = int(form.get("frame_index", 0))
+    window = parse_frame_window(form)
 
     try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
         
         wfs_list = system.wavefront_sensors
         if not (0 <= wfs_index < len(wfs_list)):
@@ -37,22 +58,20 @@ async def get_slope_frame(request: Request):
         measurement_indices = subaperture_mask[row_indices, col_indices]
         outputX = np.full(subaperture_mask.shape, np.nan)
         outputX[row_indices, col_indices] = measurements_x[measurement_indices]
-        outputX = np.where(np.isnan(outputX), None, outputX)
         
         outputY = np.full(subaperture_mask.shape, np.nan)
         outputY[row_indices, col_indices] = measurements_y[measurement_indices]
-        outputY = np.where(np.isnan(outputY), None, outputY)
-        
-        del system
-        gc.collect()
+        outputX, outputY = window.apply(outputX), window.apply(outputY)
+        value_range = None
+        if needs_value_range(form):
+            value_range = window.scale_range(await run_in_threadpool(dataset_value_range, session.file_path, "slope", wfs_index, measurements))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"AOSystem error: {e}")
         raise HTTPException(status_code=500, detail="Failed to load frame")
     
-    return JSONResponse({
-        "frameX": outputX.tolist(),
-        "frameY": outputY.tolist()
-    })
+    return array_response(request, form, {"frameX": outputX, "frameY": outputY}, value_range)
 
 @router.post("/slope/tile")
 async def get_flat_tile_post(request: Request):
@@ -61,46 +80,14 @@ async def get_flat_tile_post(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
-    frame_start = int(form.get("frame_start"))
-    frame_end = int(form.get("frame_end"))
-    index_start = int(form.get("index_start"))
-    index_end = int(form.get("index_end"))
-    wfs_index = int(form.get("index", 0))
-    
-    if frame_end <= frame_start:
-        raise HTTPException(status_code=400, detail="Invalid frame range")
-    if index_end <= index_start:
-        raise HTTPException(status_code=400, detail="Invalid index range")
-
-    try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
-        
-        wfs_list = system.wavefront_sensors
-        if not (0 <= wfs_index < len(wfs_list)):
-            raise HTTPException(status_code=400, detail=f"wfs_index {wfs_index} out of range")
-
-        measurements = wfs_list[wfs_index].measurements.data
-        
-        x_measurements = measurements[:, 0, :]
-        y_measurements = measurements[:, 1, :]
-                
-        num_frames, num_index = x_measurements.shape
-
-        frame_end = min(frame_end, num_frames)
-        index_end = min(index_end, num_index)
-
-        x_sliced = x_measurements[frame_start:frame_end, index_start:index_end]
-        y_sliced = y_measurements[frame_start:frame_end, index_start:index_end]
+    return await _slope_tile(request, session, form)
 
-        del system
-        gc.collect()
+@router.get("/slope/tile")
+async def get_flat_tile_cacheable(request: Request):
+    return await cacheable_response(request, _slope_tile)
 
-        return JSONResponse({
-            "tile": [x_sliced.tolist(), y_sliced.tolist()]
-        })
-    except Exception as e:
-        print(f"Tile fetch error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to extract tile")
+async def _slope_tile(request: Request, session: SessionData, form):
+    return await serve_tile(request, session.file_path, "slope", form)
     
 @router.post("/slope/get-meta")
 async def get_slope_meta(request: Request):
@@ -109,13 +96,34 @@ async def get_slope_meta(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
+    return JSONResponse(await _slope_meta(request, session, form))
+
+@router.get("/slope/get-meta")
+async def get_slope_meta_cacheable(request: Request):
+    return await cacheable_response(request, _slope_meta)
+
+async def _slope_meta(request: Request, session: SessionData, form) -> dict:
     try:
         wfs_index = int(form.get("wfs_index", 0))
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid wfs_index format")
+    return await run_in_threadpool(slope_meta, session.file_path, wfs_index)
 
+def slope_basic_stats(measurements: np.ndarray) -> dict:
+    """
+    Per-axis [x, y] min, max and mean of the slopes, shared by meta and default stats in a batch.
+    """
+    x = measurements[:, 0, :]
+    y = measurements[:, 1, :]
+    return {
+        "min": [float(np.min(x)), float(np.min(y))],
+        "max": [float(np.max(x)), float(np.max(y))],
+        "mean": [float(np.mean(x)), float(np.mean(y))],
+    }
+
+def slope_meta(file_path: str, wfs_index: int, basic: dict | None = None) -> dict:
     try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = open_dataset(file_path).system
         wfs_list = system.wavefront_sensors
         sensor = wfs_list[wfs_index]
         if not (0 <= wfs_index < len(wfs_list)):
@@ -124,8 +132,8 @@ async def get_slope_meta(request: Request):
         meas = sensor.measurements
         measurements = meas.data
         num_frames, dim, num_indices = measurements.shape
-        overall_min = float(np.min(measurements))
-        overall_max = float(np.max(measurements))
+        overall_min = float(np.min(basic["min"])) if basic else float(np.min(measurements))
+        overall_max = float(np.max(basic["max"])) if basic else float(np.max(measurements))
         num_rows = None
         num_cols = None
         subaperture_mask = None
@@ -138,10 +146,7 @@ async def get_slope_meta(request: Request):
         unit = None
         if hasattr(meas, "unit") and meas.unit is not None:
             unit = str(meas.unit)
-        
-        del system
-        gc.collect()
-        
+
         response = {
             "num_frames": num_frames,
             "num_indices": num_indices,
@@ -158,7 +163,7 @@ async def get_slope_meta(request: Request):
         if unit is not None:
             response["unit"] = unit
 
-        return JSONResponse(response)
+        return response
 
     except Exception as e:
         print(f"Meta error: {e}")
@@ -171,25 +176,32 @@ async def get_default_values(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
+    return JSONResponse(await _slope_default_stats(request, session, form))
+
+@router.get("/slope/get-default-stats")
+async def get_default_values_cacheable(request: Request):
+    return await cacheable_response(request, _slope_default_stats)
+
+async def _slope_default_stats(request: Request, session: SessionData, form) -> dict:
     wfs_index = int(form.get("index", 0))
+    return await run_in_threadpool(slope_default_stats, session.file_path, wfs_index)
 
+def slope_default_stats(file_path: str, wfs_index: int, basic: dict | None = None) -> dict:
     try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = open_dataset(file_path).system
         measurements = system.wavefront_sensors[wfs_index].measurements.data
         x = measurements[:, 0, :]
         y = measurements[:, 1, :]
+        basic = basic or slope_basic_stats(measurements)
 
-        del system
-        gc.collect()
-        
-        return JSONResponse({
-            "min": [float(np.min(x)), float(np.min(y))],
-            "max": [float(np.max(x)), float(np.max(y))],
-            "mean": [float(np.mean(x)), float(np.mean(y))],
+        return {
+            "min": basic["min"],
+            "max": basic["max"],
+            "mean": basic["mean"],
             "median": [float(np.median(x)), float(np.median(y))],
             "std": [float(np.std(x)), float(np.std(y))],
             "variance": [float(np.var(x)), float(np.var(y))],
-        })
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Histogram error: {e}")
     
@@ -206,11 +218,8 @@ async def get_slope_point_stats(request: Request):
         wfs_index = int(form.get("index", 0))
         point_index = int(form.get("point_index"))
 
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
         measurements = system.wavefront_sensors[wfs_index].measurements.data
-        
-        del system
-        gc.collect()
 
         intensitiesX = measurements[:, 0, point_index]
         intensitiesY = measurements[:, 1, point_index]
@@ -235,3 +244,174 @@ async def get_slope_point_stats(request: Request):
     except Exception as e:
         print(f"Exception occurred: {e}")
         raise HTTPException(status_code=500, detail=f"Point stats error: {e}")
+
+
+# Per-subaperture min, max, mean, std and rms over every frame, as [x, y] pairs.
+# With layout=pupil the values are placed on the subaperture mask grid instead.
+@router.post("/slope/get-stat-maps")
+async def get_slope_stat_maps(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        wfs_index = int(form.get("index", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid index format")
+
+    layout = form.get("layout", "flat")
+    if layout not in ("flat", "pupil"):
+        raise HTTPException(status_code=400, detail=f"Invalid layout: {layout}")
+
+    def compute():
+        return build_slope_stat_maps(session.file_path, open_dataset(session.file_path).system, wfs_index)
+
+    try:
+        cached = await run_in_threadpool(get_or_compute, session.file_path, ("stat_maps", "slope", wfs_index), compute)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Stat maps error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute stat maps")
+
+    stats = cached["stats"]
+    if layout == "flat":
+        return JSONResponse({name: nan_to_none(stats[name]) for name in STAT_NAMES})
+
+    subaperture_mask = cached["subaperture_mask"]
+    if subaperture_mask is None or subaperture_mask.ndim != 2:
+        raise HTTPException(status_code=400, detail="Sensor has no 2D subaperture mask")
+
+    cells = subaperture_cells(subaperture_mask)
+    return JSONResponse({
+        name: nan_to_none(scatter_to_grid(stats[name], subaperture_mask.shape, cells))
+        for name in STAT_NAMES
+    })
+
+
+# Mean or std slope maps over the frames [frame_start, frame_end), served from the prefix-sum index
+@router.post("/slope/get-range-frame")
+async def get_slope_range_frame(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        wfs_index = int(form.get("index", 0))
+        frame_start = int(form.get("frame_start"))
+        frame_end = int(form.get("frame_end"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid index or frame range format")
+
+    stat = form.get("stat", "mean")
+    if stat not in ("mean", "std"):
+        raise HTTPException(status_code=400, detail=f"Invalid stat: {stat}")
+    window = parse_frame_window(form)
+
+    def compute():
+        return build_slope_prefix_index(session.file_path, open_dataset(session.file_path).system, wfs_index)
+
+    try:
+        cached = await run_in_threadpool(get_or_compute, session.file_path, ("prefix_index", "slope", wfs_index), compute)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Prefix index error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to build frame index")
+
+    index = cached["index"]
+    frame_end = min(frame_end, index.num_frames)
+    if not (0 <= frame_start < frame_end):
+        raise HTTPException(status_code=400, detail="Invalid frame range")
+
+    values = index.range_mean(frame_start, frame_end) if stat == "mean" else index.range_std(frame_start, frame_end)
+    subaperture_mask = cached["subaperture_mask"]
+    output = scatter_to_grid(values, subaperture_mask.shape, subaperture_cells(subaperture_mask))
+
+    return JSONResponse({
+        "frameX": nan_to_none(window.apply(output[0])),
+        "frameY": nan_to_none(window.apply(output[1]))
+    })
+
+
+# Covariance or correlation matrix of the slopes (x then y per subaperture), accumulated over frame chunks
+@router.post("/slope/get-covariance")
+async def get_slope_covariance(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    return await serve_covariance(request, session.file_path, "slope", form)
+
+
+# Per-frame min/max/mean/rms/NaN/saturation strip of a wavefront sensor, downsampled for the overview, with anomalous frames to jump to
+@router.post("/slope/get-frame-summary")
+async def get_slope_frame_summary(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        return JSONResponse(await run_in_threadpool(frame_summary_payload, session.file_path, "slope", form))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Frame summary error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute frame summary")
+
+
+# Frames and subapertures where the x, y or either slope meets a threshold predicate, scanning only the zones whose min/max allow a match
+@router.post("/slope/search")
+async def search_slope(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        return JSONResponse(await run_in_threadpool(search_payload, session.file_path, "slope", form))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Search error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search slope data")
+
+
+# Playback run of slope X/Y maps: keyframes plus per-frame sparse or dense deltas of the quantized frames
+@router.post("/slope/get-frame-sequence")
+async def get_slope_frame_sequence(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    return await serve_frame_sequence(request, session.file_path, "slope", form)
+
+
+def get_sensor(system, wfs_index: int):
+    wfs_list = system.wavefront_sensors
+    if not (0 <= wfs_index < len(wfs_list)):
+        raise HTTPException(status_code=400, detail=f"wfs_index {wfs_index} out of range")
+    return wfs_list[wfs_index]
+
+def build_slope_stat_maps(file_path: str, system, wfs_index: int, progress=None):
+    sensor = get_sensor(system, wfs_index)
+    stats = compute_stat_maps(sensor.measurements.data, progress)
+    subaperture_mask = None
+    if getattr(sensor, "subaperture_mask", None) is not None:
+        subaperture_mask = np.asarray(sensor.subaperture_mask.data)
+    return {"stats": stats, "subaperture_mask": subaperture_mask}
+
+def build_slope_prefix_index(file_path: str, system, wfs_index: int, progress=None):
+    sensor = get_sensor(system, wfs_index)
+    index = build_prefix_index(sensor.measurements.data, scratch_dir(file_path), f"slope-{wfs_index}", progress)
+    return {"index": index, "subaperture_mask": np.asarray(sensor.subaperture_mask.data)}
+
+register_ingestion_step("slope stat maps", 10, "stat_maps", "slope", lambda system: [s.measurements is not None for s in system.wavefront_sensors], build_slope_stat_maps)
+register_ingestion_step("slope frame index", 20, "prefix_index", "slope", lambda system: [s.measurements is not None and getattr(s, "subaperture_mask", None) is not None for s in system.wavefront_sensors], build_slope_prefix_index)
+register_ingestion_step("slope frame summary", 5, "frame_summary", "slope", lambda system: [s.measurements is not None for s in system.wavefront_sensors], lambda file_path, system, index, progress: build_frame_summary(file_path, "slope", index, progress=progress))
+register_ingestion_step("slope zone map", 15, "zone_map", "slope", lambda system: [s.measurements is not None for s in system.wavefront_sensors], lambda file_path, system, index, progress: build_zone_map(file_path, "slope", index, progress))
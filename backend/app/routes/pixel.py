@@ -1,9 +1,22 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import numpy as np
 from ..session.actions import get_session_from_cookie
-import aotpy
-import gc
+from ..session.manager import SessionData
+from ..services.http_cache import cacheable_response
+from ..services.dataset import open_dataset
+from ..services.dataset_cache import get_or_compute, scratch_dir
+from ..services.prefix_index import build_prefix_index
+from ..services.tile_cache import serve_tile
+from ..services.ingestion import register_ingestion_step
+from ..services.encoding import array_response, dataset_value_range, needs_value_range
+from ..services.binning import parse_frame_window
+from ..services.frame_sequence import serve_frame_sequence
+from ..services.zone_map import build_zone_map, search_payload
+from ..services.frame_summary import build_frame_summary, frame_summary_payload
+from ..services.stat_maps import STAT_NAMES, compute_stat_maps
+from ..utils import nan_to_none
 
 router = APIRouter()
 
@@ -14,12 +27,19 @@ async def get_pixel_frame(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
+    return await _pixel_frame(request, session, form)
 
+@router.get("/pixel/get-frame")
+async def get_pixel_frame_cacheable(request: Request):
+    return await cacheable_response(request, _pixel_frame)
+
+async def _pixel_frame(request: Request, session: SessionData, form):
     wfs_index = int(form.get("index", 0))
     frame_index = int(form.get("frame_index", 0))
+    window = parse_frame_window(form)
 
     try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
         
         wfs_list = system.wavefront_sensors
         if not (0 <= wfs_index < len(wfs_list)):
@@ -29,15 +49,17 @@ async def get_pixel_frame(request: Request):
         if not (0 <= frame_index < data.shape[0]):
             raise HTTPException(status_code=400, detail=f"frame_index {frame_index} out of range")
 
-        frame = data[frame_index]
-    
-        del system
-        gc.collect()
+        frame = window.apply(data[frame_index])
+        value_range = None
+        if needs_value_range(form):
+            value_range = window.scale_range(await run_in_threadpool(dataset_value_range, session.file_path, "pixel", wfs_index, data))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"AOSystem error: {e}")
         raise HTTPException(status_code=500, detail="Failed to load frame")
     
-    return JSONResponse({"frame": frame.tolist()})
+    return array_response(request, form, {"frame": frame}, value_range)
 
 @router.post("/pixel/tile")
 async def get_flat_tile_post(request: Request):
@@ -46,49 +68,14 @@ async def get_flat_tile_post(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
-    frame_start = int(form.get("frame_start"))
-    frame_end = int(form.get("frame_end"))
-    index_start = int(form.get("index_start"))
-    index_end = int(form.get("index_end"))
-    wfs_index = int(form.get("index", 0))
-
-    if frame_end <= frame_start:
-        raise HTTPException(status_code=400, detail="Invalid frame range")
-    if index_end <= index_start:
-        raise HTTPException(status_code=400, detail="Invalid index range")
-
-    try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
-        
-        wfs_list = system.wavefront_sensors
-        if not (0 <= wfs_index < len(wfs_list)):
-            raise HTTPException(status_code=400, detail=f"wfs_index {wfs_index} out of range")
-
-        data3d = wfs_list[wfs_index].detector.pixel_intensities.data  # shape is [frame][col][row]
-        
-        num_frames, num_cols, num_rows = data3d.shape
-
-        frame_end = min(frame_end, num_frames)
-        index_end = min(index_end, num_cols * num_rows)
-        
-        flat_indices = np.arange(index_start, index_end)
-        cols = flat_indices // num_rows
-        rows = flat_indices % num_rows
-        valid_mask = (cols < num_cols) & (rows < num_rows)
-        cols = cols[valid_mask]
-        rows = rows[valid_mask]
-        frame_range = np.arange(frame_start, frame_end)
-        sliced = data3d[frame_range[:, None], cols[None, :], rows[None, :]]
-        del system
-        gc.collect()
+    return await _pixel_tile(request, session, form)
 
-        return JSONResponse({
-            "tile": sliced.tolist(),
-        })
+@router.get("/pixel/tile")
+async def get_flat_tile_cacheable(request: Request):
+    return await cacheable_response(request, _pixel_tile)
 
-    except Exception as e:
-        print(f"Tile fetch error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to extract tile")
+async def _pixel_tile(request: Request, session: SessionData, form):
+    return await serve_tile(request, session.file_path, "pixel", form)
     
 @router.post("/pixel/get-meta")
 async def get_pixel_meta(request: Request):
@@ -97,32 +84,44 @@ async def get_pixel_meta(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
+    return JSONResponse(await _pixel_meta(request, session, form))
+
+@router.get("/pixel/get-meta")
+async def get_pixel_meta_cacheable(request: Request):
+    return await cacheable_response(request, _pixel_meta)
+
+async def _pixel_meta(request: Request, session: SessionData, form) -> dict:
     try:
         wfs_index = int(form.get("wfs_index", 0))
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid wfs_index format")
+    return await run_in_threadpool(pixel_meta, session.file_path, wfs_index)
+
+def pixel_basic_stats(data: np.ndarray) -> dict:
+    """
+    Min, max and mean of the pixel data, shared by meta and default stats in a batch.
+    """
+    return {"min": float(np.min(data)), "max": float(np.max(data)), "mean": float(np.mean(data))}
 
+def pixel_meta(file_path: str, wfs_index: int, basic: dict | None = None) -> dict:
     try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = open_dataset(file_path).system
         wfs_list = system.wavefront_sensors
         if not (0 <= wfs_index < len(wfs_list)):
             raise HTTPException(status_code=400, detail=f"wfs_index {wfs_index} out of range")
 
         data = wfs_list[wfs_index].detector.pixel_intensities.data
         num_frames, num_cols, num_rows = data.shape
-        overall_min = float(np.min(data))
-        overall_max = float(np.max(data))
-        
-        del system
-        gc.collect()
+        overall_min = basic["min"] if basic else float(np.min(data))
+        overall_max = basic["max"] if basic else float(np.max(data))
 
-        return JSONResponse({
+        return {
             "num_frames": num_frames,
             "num_cols": num_cols,
             "num_rows": num_rows,
             "overall_min": overall_min,
             "overall_max": overall_max
-        })
+        }
 
     except Exception as e:
         print(f"Meta error: {e}")
@@ -135,21 +134,29 @@ async def get_default_values(request: Request):
         raise HTTPException(status_code=400, detail="No active session or file path")
 
     form = await request.form()
+    return JSONResponse(await _pixel_default_stats(request, session, form))
+
+@router.get("/pixel/get-default-stats")
+async def get_default_values_cacheable(request: Request):
+    return await cacheable_response(request, _pixel_default_stats)
+
+async def _pixel_default_stats(request: Request, session: SessionData, form) -> dict:
     wfs_index = int(form.get("index", 0))
+    return await run_in_threadpool(pixel_default_stats, session.file_path, wfs_index)
 
+def pixel_default_stats(file_path: str, wfs_index: int, basic: dict | None = None) -> dict:
     try:
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = open_dataset(file_path).system
         data = system.wavefront_sensors[wfs_index].detector.pixel_intensities.data
-        del system
-        gc.collect()
-        return JSONResponse({
-            "min": float(np.min(data)),
-            "max": float(np.max(data)),
-            "mean": float(np.mean(data)),
+        basic = basic or pixel_basic_stats(data)
+        return {
+            "min": basic["min"],
+            "max": basic["max"],
+            "mean": basic["mean"],
             "median": float(np.median(data)),
             "std": float(np.std(data)),
             "variance": float(np.var(data)),
-        })
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Histogram error: {e}")
     
@@ -167,12 +174,9 @@ async def get_pixel_point_stats(request: Request):
         col = int(form.get("point_col"))
         row = int(form.get("point_row"))
 
-        system = aotpy.AOSystem.read_from_file(session.file_path)
+        system = (await run_in_threadpool(open_dataset, session.file_path)).system
         data = system.wavefront_sensors[wfs_index].detector.pixel_intensities.data
 
-        del system
-        gc.collect()
-
         # Extract intensity time series for this (col, row)
         intensities = data[:, col, row]
 
@@ -195,3 +199,137 @@ async def get_pixel_point_stats(request: Request):
     except Exception as e:
         print(f"Exception occurred: {e}")
         raise HTTPException(status_code=500, detail=f"Point stats error: {e}")
+
+
+# Per-pixel min, max, mean, std and rms over every frame, as (col, row) grids
+@router.post("/pixel/get-stat-maps")
+async def get_pixel_stat_maps(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        wfs_index = int(form.get("index", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid index format")
+
+    def compute():
+        return build_pixel_stat_maps(session.file_path, open_dataset(session.file_path).system, wfs_index)
+
+    try:
+        stats = await run_in_threadpool(get_or_compute, session.file_path, ("stat_maps", "pixel", wfs_index), compute)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Stat maps error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute stat maps")
+
+    return JSONResponse({name: nan_to_none(stats[name]) for name in STAT_NAMES})
+
+
+# Mean or std detector image over the frames [frame_start, frame_end), served from the prefix-sum index
+@router.post("/pixel/get-range-frame")
+async def get_pixel_range_frame(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        wfs_index = int(form.get("index", 0))
+        frame_start = int(form.get("frame_start"))
+        frame_end = int(form.get("frame_end"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid index or frame range format")
+
+    stat = form.get("stat", "mean")
+    if stat not in ("mean", "std"):
+        raise HTTPException(status_code=400, detail=f"Invalid stat: {stat}")
+    window = parse_frame_window(form)
+
+    def compute():
+        return build_pixel_prefix_index(session.file_path, open_dataset(session.file_path).system, wfs_index)
+
+    try:
+        index = await run_in_threadpool(get_or_compute, session.file_path, ("prefix_index", "pixel", wfs_index), compute)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Prefix index error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to build frame index")
+
+    frame_end = min(frame_end, index.num_frames)
+    if not (0 <= frame_start < frame_end):
+        raise HTTPException(status_code=400, detail="Invalid frame range")
+
+    frame = index.range_mean(frame_start, frame_end) if stat == "mean" else index.range_std(frame_start, frame_end)
+    return JSONResponse({"frame": nan_to_none(window.apply(frame))})
+
+
+# Per-frame min/max/mean/rms/NaN/saturation strip of a wavefront sensor, downsampled for the overview, with anomalous frames to jump to
+@router.post("/pixel/get-frame-summary")
+async def get_pixel_frame_summary(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        return JSONResponse(await run_in_threadpool(frame_summary_payload, session.file_path, "pixel", form))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Frame summary error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute frame summary")
+
+
+# Frames and pixels where the intensity meets a threshold predicate, scanning only the zones whose min/max allow a match
+@router.post("/pixel/search")
+async def search_pixel(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    try:
+        return JSONResponse(await run_in_threadpool(search_payload, session.file_path, "pixel", form))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Search error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search pixel data")
+
+
+# Playback run of pixel images: keyframes plus per-frame sparse or dense deltas of the quantized frames
+@router.post("/pixel/get-frame-sequence")
+async def get_pixel_frame_sequence(request: Request):
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    form = await request.form()
+    return await serve_frame_sequence(request, session.file_path, "pixel", form)
+
+
+def get_pixel_intensities(system, wfs_index: int):
+    wfs_list = system.wavefront_sensors
+    if not (0 <= wfs_index < len(wfs_list)):
+        raise HTTPException(status_code=400, detail=f"wfs_index {wfs_index} out of range")
+    return wfs_list[wfs_index].detector.pixel_intensities.data
+
+def build_pixel_stat_maps(file_path: str, system, wfs_index: int, progress=None):
+    return compute_stat_maps(get_pixel_intensities(system, wfs_index), progress)
+
+def build_pixel_prefix_index(file_path: str, system, wfs_index: int, progress=None):
+    data = get_pixel_intensities(system, wfs_index)
+    return build_prefix_index(data, scratch_dir(file_path), f"pixel-{wfs_index}", progress)
+
+def has_pixel_intensities(sensor) -> bool:
+    return sensor.detector is not None and sensor.detector.pixel_intensities is not None
+
+# Per-pixel derived data is built on first request; the frame summary is one row per frame
+register_ingestion_step("pixel stat maps", 10, "stat_maps", "pixel", lambda system: [has_pixel_intensities(s) for s in system.wavefront_sensors], build_pixel_stat_maps, eager=False)
+register_ingestion_step("pixel frame index", 20, "prefix_index", "pixel", lambda system: [has_pixel_intensities(s) for s in system.wavefront_sensors], build_pixel_prefix_index, eager=False)
+register_ingestion_step("pixel frame summary", 5, "frame_summary", "pixel", lambda system: [has_pixel_intensities(s) for s in system.wavefront_sensors], lambda file_path, system, index, progress: build_frame_summary(file_path, "pixel", index, progress=progress))
+register_ingestion_step("pixel zone map", 15, "zone_map", "pixel", lambda system: [has_pixel_intensities(s) for s in system.wavefront_sensors], lambda file_path, system, index, progress: build_zone_map(file_path, "pixel", index, progress), eager=False)
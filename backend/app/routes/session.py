@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
 from ..services.aot_extractor import extract_metadata_from_file
+from ..services.http_cache import cached_content_hash, dataset_fingerprint
 
 from ..session.actions import get_session_from_cookie, update_session
 
@@ -13,6 +15,8 @@ async def check_session(request: Request):
     if session is not None:
         await update_session(session)
         metadata = extract_metadata_from_file(session.file_path)
-        return JSONResponse({"metadata": metadata})
+        dataset_id = await run_in_threadpool(dataset_fingerprint, session.file_path)
+        # The full SHA-256 is filled in by the ingestion job; null until it has run
+        return JSONResponse({"metadata": metadata, "dataset_id": dataset_id, "content_hash": cached_content_hash(session.file_path)})
     else: return JSONResponse({"active": False})
         
\ No newline at end of file
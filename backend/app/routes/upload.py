@@ -1,10 +1,16 @@
+from uuid import UUID
 from fastapi import APIRouter, UploadFile, File, HTTPException, Request
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import tempfile
 import shutil
+import os
 from ..session.manager import SESSION_COOKIE_NAME
 from ..session.actions import create_session, get_session_from_cookie, update_session
 from ..services.aot_extractor import extract_metadata_from_file
+from ..services.http_cache import dataset_fingerprint
+from ..services.ingestion import start_ingestion
+from ..services.chunked_upload import DEFAULT_CHUNK_SIZE, UploadClosed, upload_store, initiate_upload
 
 router = APIRouter()
 
@@ -18,17 +24,24 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
     
     # Extract metadata from the file to show the user a preview
     metadata = extract_metadata_from_file(tmp_path)
+    return await attach_file_to_session(request, tmp_path, metadata)
+
+# Attach an uploaded file to the caller's session, creating the session if needed
+async def attach_file_to_session(request: Request, tmp_path: str, metadata: dict) -> JSONResponse:
+    dataset_id = await run_in_threadpool(dataset_fingerprint, tmp_path)
     session = await get_session_from_cookie(request)
     
     if session is not None:
         await update_session(session, tmp_path)
-        return JSONResponse({"metadata": metadata})
+        start_ingestion(tmp_path)
+        return JSONResponse({"metadata": metadata, "dataset_id": dataset_id})
     else:
         new_session_id = await create_session(tmp_path)
         if new_session_id is None:
             raise HTTPException(status_code=500, detail="Failed to create session")
+        start_ingestion(tmp_path)
 
-        response = JSONResponse({"metadata": metadata})
+        response = JSONResponse({"metadata": metadata, "dataset_id": dataset_id})
         response.set_cookie(
             key=SESSION_COOKIE_NAME,
             value=str(new_session_id),
@@ -38,4 +51,83 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
         )
         
         return response
-    
\ No newline at end of file
+
+# Resumable upload: initiate, PUT numbered chunks (in any order, possibly in parallel), then finalize
+@router.post("/upload/initiate")
+async def initiate_chunked_upload(request: Request):
+    form = await request.form()
+    try:
+        size = int(form.get("size"))
+        chunk_size = int(form.get("chunk_size", DEFAULT_CHUNK_SIZE))
+        upload_id = initiate_upload(size, chunk_size)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid upload parameters: {e}")
+
+    upload = upload_store[upload_id]
+    return JSONResponse({
+        "upload_id": str(upload_id),
+        "chunk_size": upload.chunk_size,
+        "total_chunks": upload.total_chunks
+    })
+
+def get_upload(upload_id: UUID):
+    upload = upload_store.get(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    return upload
+
+# Finalize and abort wait for no chunk to be mid-write, so its file is never closed under it
+def take_idle_upload(upload_id: UUID):
+    upload = get_upload(upload_id)
+    if upload.active_writes:
+        raise HTTPException(status_code=409, detail=f"{upload.active_writes} chunk writes still in progress")
+    return upload_store.pop(upload_id)
+
+@router.put("/upload/{upload_id}/chunks/{chunk_index}")
+async def put_upload_chunk(request: Request, upload_id: UUID, chunk_index: int):
+    upload = get_upload(upload_id)
+    if not (0 <= chunk_index < upload.total_chunks):
+        raise HTTPException(status_code=400, detail=f"chunk_index {chunk_index} out of range")
+
+    try:
+        await upload.write_chunk(chunk_index, request.stream(), request.headers.get("x-chunk-sha256"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadClosed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return JSONResponse({"received": len(upload.received), "total_chunks": upload.total_chunks})
+
+# Lets a client resume an interrupted upload by sending only the missing chunks
+@router.get("/upload/{upload_id}")
+async def get_upload_status(upload_id: UUID):
+    upload = get_upload(upload_id)
+    return JSONResponse({
+        "size": upload.size,
+        "chunk_size": upload.chunk_size,
+        "total_chunks": upload.total_chunks,
+        "missing_chunks": upload.missing_chunks()
+    })
+
+@router.post("/upload/{upload_id}/finalize")
+async def finalize_chunked_upload(request: Request, upload_id: UUID):
+    upload = get_upload(upload_id)
+    missing = upload.missing_chunks()
+    if missing:
+        raise HTTPException(status_code=409, detail=f"{len(missing)} chunks still missing")
+
+    take_idle_upload(upload_id)
+    await run_in_threadpool(upload.close)
+    try:
+        metadata = await run_in_threadpool(extract_metadata_from_file, upload.file_path)
+    except RuntimeError as e:
+        os.unlink(upload.file_path)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await attach_file_to_session(request, upload.file_path, metadata)
+
+@router.delete("/upload/{upload_id}")
+async def abort_chunked_upload(upload_id: UUID):
+    upload = take_idle_upload(upload_id)
+    await run_in_threadpool(upload.discard)
+    return JSONResponse({"aborted": True})
@@ -1,9 +1,9 @@
 from dataclasses import asdict
 from datetime import datetime
-import gc
-import aotpy
 
 def extract_metadata_from_file(path: str) -> dict:
+    import aotpy  # deferred: loaded by the startup warm-up, not at import time
+
     try:
         system = aotpy.AOSystem.read_from_file(path)
     except Exception as e:
@@ -78,6 +78,4 @@ def extract_metadata_from_file(path: str) -> dict:
             for src in system.sources
         ],
     }
-    del system
-    gc.collect()
     return metadata
@@ -0,0 +1,91 @@
+from typing import Mapping
+import numpy as np
+from fastapi import HTTPException
+
+REDUCTIONS = ("sum", "mean", "max")
+
+class FrameWindow:
+    """
+    Region of interest and integer binning of a 2D frame request.
+
+    Frames are laid out [col][row] (pixel images, slope grids and influence functions
+    alike), so `cols` slices axis -2 and `rows` axis -1; ends past the edge are clipped,
+    as with any slice, and `factor` × `factor` blocks of the window are then reduced with
+    `reduction`. NaN cells are ignored; a block that is all NaN stays NaN.
+    """
+    def __init__(self, rows: slice, cols: slice, factor: int, reduction: str):
+        self.rows = rows
+        self.cols = cols
+        self.factor = factor
+        self.reduction = reduction
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        return self.bin(self.crop(frame))
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """
+        The window of a frame (or of a stack of frames, on its last two axes).
+        """
+        window = frame[..., self.cols, self.rows]
+        if window.shape[-1] == 0 or window.shape[-2] == 0:
+            raise HTTPException(status_code=400, detail="Region of interest is outside the frame")
+        return window
+
+    def bin(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Reduce an already windowed frame (or stack of frames); the edge blocks of a
+        window that is not a multiple of `factor` cover what is left.
+        """
+        factor = self.factor
+        if factor == 1:
+            return frame
+
+        *leading, height, width = frame.shape
+        out_height, out_width = -(-height // factor), -(-width // factor)
+        padded = np.full((*leading, out_height * factor, out_width * factor), np.nan)
+        padded[..., :height, :width] = frame
+        blocks = padded.reshape(*leading, out_height, factor, out_width, factor)
+
+        if self.reduction == "max":
+            return np.fmax.reduce(np.fmax.reduce(blocks, axis=-1), axis=-2)
+
+        valid = ~np.isnan(blocks)
+        count = valid.sum(axis=(-3, -1))
+        total = np.where(valid, blocks, 0.0).sum(axis=(-3, -1))
+        if self.reduction == "mean":
+            total = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+        return np.where(count > 0, total, np.nan)
+
+    def scale_range(self, value_range: tuple[float, float] | None) -> tuple[float, float] | None:
+        """
+        Dataset value range of the binned frames, for quantized encodings: a sum of up
+        to factor² values can reach factor² times the per-cell range.
+        """
+        if value_range is None or self.reduction != "sum" or self.factor == 1:
+            return value_range
+        cells = self.factor * self.factor
+        low, high = value_range
+        return min(low, low * cells), max(high, high * cells)
+
+def parse_frame_window(form: Mapping) -> FrameWindow:
+    """
+    FrameWindow from the optional `row_start`, `row_end`, `col_start`, `col_end`,
+    `bin` and `reduction` fields of a frame request; defaults to the whole frame, unbinned.
+    """
+    try:
+        bounds = [form.get(name) for name in ("row_start", "row_end", "col_start", "col_end")]
+        row_start, row_end, col_start, col_end = [int(value) if value not in (None, "") else None for value in bounds]
+        factor = int(form.get("bin", 1))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid region or bin format")
+
+    reduction = form.get("reduction", "mean")
+    if reduction not in REDUCTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid reduction: {reduction}")
+    if factor < 1:
+        raise HTTPException(status_code=400, detail="bin must be a positive integer")
+    for start, end in ((row_start, row_end), (col_start, col_end)):
+        if (start is not None and start < 0) or (end is not None and end <= (start or 0)):
+            raise HTTPException(status_code=400, detail="Invalid region of interest")
+
+    return FrameWindow(slice(row_start, row_end), slice(col_start, col_end), factor, reduction)
@@ -0,0 +1,135 @@
+import hashlib
+import math
+import os
+import tempfile
+from datetime import datetime
+import datetime as dt
+from uuid import UUID, uuid4
+from starlette.concurrency import run_in_threadpool
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Uploads with no activity for this long (seconds) are dropped by the cleanup loop
+UPLOAD_TIMEOUT = 3600
+# Body pieces are gathered up to this size before each write to the file
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+class UploadClosed(Exception):
+    pass
+
+class ChunkedUpload:
+    """
+    A file being uploaded in numbered chunks, possibly out of order and in parallel.
+
+    The destination file is created at its final size up front and every chunk
+    is written straight to its offset, so nothing is buffered or copied again
+    once the last chunk arrives. `active_writes` counts the chunks being streamed
+    in; the upload must only be closed while it is zero.
+    """
+    def __init__(self, size: int, chunk_size: int):
+        self.size = size
+        self.chunk_size = chunk_size
+        self.total_chunks = max(1, math.ceil(size / chunk_size))
+        self.received: set[int] = set()
+        self.active_writes = 0
+        self.updated_at = datetime.now(dt.UTC)
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".fits") as tmp:
+            self.file_path = tmp.name
+        self.fd = os.open(self.file_path, os.O_RDWR)
+        os.ftruncate(self.fd, size)
+
+    def chunk_length(self, chunk_index: int) -> int:
+        if chunk_index == self.total_chunks - 1:
+            return self.size - chunk_index * self.chunk_size
+        return self.chunk_size
+
+    def missing_chunks(self) -> list[int]:
+        return [i for i in range(self.total_chunks) if i not in self.received]
+
+    def is_expired(self, timeout: int = UPLOAD_TIMEOUT) -> bool:
+        return (datetime.now(dt.UTC) - self.updated_at).total_seconds() > timeout
+
+    async def write_chunk(self, chunk_index: int, stream, checksum: str | None) -> None:
+        """
+        Stream one chunk from the request body into place, verifying its length and,
+        when given, its SHA-256. Raises ValueError if either does not match; the
+        chunk then stays missing and can simply be sent again. Raises UploadClosed
+        once the upload has been finalized or discarded. Writes run on the threadpool.
+        """
+        if self.fd is None:
+            raise UploadClosed(f"Chunk {chunk_index} arrived after the upload was closed")
+        self.active_writes += 1
+        try:
+            await self.stream_chunk(chunk_index, stream, checksum)
+        finally:
+            self.active_writes -= 1
+            self.updated_at = datetime.now(dt.UTC)
+
+    async def stream_chunk(self, chunk_index: int, stream, checksum: str | None) -> None:
+        self.updated_at = datetime.now(dt.UTC)
+        self.received.discard(chunk_index)
+
+        expected = self.chunk_length(chunk_index)
+        offset = chunk_index * self.chunk_size
+        written = 0
+        digest = hashlib.sha256()
+        buffer = bytearray()
+
+        async for piece in stream:
+            if written + len(buffer) + len(piece) > expected:
+                raise ValueError(f"Chunk {chunk_index} is larger than {expected} bytes")
+            digest.update(piece)
+            buffer += piece
+            if len(buffer) >= WRITE_BUFFER_SIZE:
+                await run_in_threadpool(os.pwrite, self.fd, bytes(buffer), offset + written)
+                written += len(buffer)
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(os.pwrite, self.fd, bytes(buffer), offset + written)
+            written += len(buffer)
+
+        if written != expected:
+            raise ValueError(f"Chunk {chunk_index} has {written} bytes, expected {expected}")
+        if checksum is not None and digest.hexdigest() != checksum.lower():
+            raise ValueError(f"Checksum mismatch for chunk {chunk_index}")
+
+        self.received.add(chunk_index)
+
+    def close(self, sync: bool = True) -> None:
+        """
+        Close the file, flushing it to disk unless it is about to be deleted. Blocking:
+        call it on the threadpool from async code.
+        """
+        fd, self.fd = self.fd, None
+        if fd is not None:
+            if sync:
+                os.fsync(fd)
+            os.close(fd)
+
+    def discard(self) -> None:
+        self.close(sync=False)
+        try:
+            os.unlink(self.file_path)
+        except FileNotFoundError:
+            pass
+
+# In-memory store of uploads in progress
+upload_store: dict[UUID, ChunkedUpload] = {}
+
+def initiate_upload(size: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> UUID:
+    if size <= 0:
+        raise ValueError("size must be positive")
+    if not (0 < chunk_size <= MAX_CHUNK_SIZE):
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+
+    upload_id = uuid4()
+    upload_store[upload_id] = ChunkedUpload(size, chunk_size)
+    return upload_id
+
+def delete_expired_uploads() -> None:
+    # A chunk still being streamed keeps its upload alive however long it takes
+    expired = [upload_id for upload_id, upload in upload_store.items() if upload.is_expired() and not upload.active_writes]
+    for upload_id in expired:
+        upload_store.pop(upload_id).discard()
+        print(f"Upload {upload_id} has been discarded due to inactivity.")
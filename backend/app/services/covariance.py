@@ -0,0 +1,139 @@
+from typing import Callable
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from .dataset import open_dataset
+from .dataset_cache import get_or_compute
+from .encoding import array_response
+from .stat_maps import frames_per_chunk
+
+# Headers describing a matrix response: frames used and the decimation block size
+COVARIANCE_HEADERS = ["X-Covariance-Frames", "X-Covariance-Block"]
+
+def chunk_moments(block: np.ndarray) -> tuple[int, np.ndarray, np.ndarray]:
+    """
+    (count, mean, co-moment matrix) of the frames in `block`, shaped (frames, variables).
+    Frames with any NaN are left out so every entry of the matrix uses the same frames.
+    """
+    block = block[~np.isnan(block).any(axis=1)]
+    count = block.shape[0]
+    if count == 0:
+        size = block.shape[1]
+        return 0, np.zeros(size), np.zeros((size, size))
+    mean = block.mean(axis=0)
+    centered = block - mean
+    return count, mean, centered.T @ centered
+
+def merge_moments(a: tuple[int, np.ndarray, np.ndarray], b: tuple[int, np.ndarray, np.ndarray]) -> tuple[int, np.ndarray, np.ndarray]:
+    """
+    Chan et al. pairwise merge of two (count, mean, co-moment) accumulators.
+    """
+    count_a, mean_a, comoment_a = a
+    count_b, mean_b, comoment_b = b
+    total = count_a + count_b
+    if count_a == 0 or count_b == 0:
+        return b if count_a == 0 else a
+    delta = mean_b - mean_a
+    mean = mean_a + delta * (count_b / total)
+    comoment = comoment_a + comoment_b + np.outer(delta, delta) * (count_a * count_b / total)
+    return total, mean, comoment
+
+def compute_covariance(data: np.ndarray, progress: Callable[[float], None] | None = None) -> dict:
+    """
+    Covariance of the per-frame variables of `data` (every element of a frame is one
+    variable), accumulated over frame chunks so memory stays at one chunk plus the
+    variables² matrix. The per-chunk Xᵀ X product is where the time goes, and BLAS
+    already spreads it over the cores.
+
+    Returns the number of frames used, the mean and the (unbiased) covariance matrix.
+    """
+    num_frames = data.shape[0]
+    size = int(np.prod(data.shape[1:], dtype=np.int64))
+    step = frames_per_chunk(data)
+    starts = list(range(0, num_frames, step))
+
+    moments = (0, np.zeros(size), np.zeros((size, size)))
+    for n, start in enumerate(starts):
+        block = np.asarray(data[start:start + step], dtype=np.float64).reshape(-1, size)
+        moments = merge_moments(moments, chunk_moments(block))
+        if progress is not None:
+            progress((n + 1) / len(starts))
+
+    count, mean, comoment = moments
+    covariance = comoment / (count - 1) if count > 1 else np.full((size, size), np.nan)
+    return {"count": count, "mean": mean, "covariance": covariance}
+
+def correlation_from_covariance(covariance: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation matrix; variables with zero variance come out as NaN.
+    """
+    std = np.sqrt(np.diag(covariance))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlation = covariance / np.outer(std, std)
+    correlation[~np.isfinite(correlation)] = np.nan
+    return correlation
+
+def decimate_matrix(matrix: np.ndarray, max_size: int) -> tuple[int, np.ndarray]:
+    """
+    Block-average a square matrix so neither side exceeds `max_size`.
+    Returns the block size and the reduced matrix; ragged edge blocks average what they hold.
+    """
+    size = matrix.shape[0]
+    block = max(1, -(-size // max_size))
+    if block == 1:
+        return 1, matrix
+    out_size = -(-size // block)
+    padded = np.full((out_size * block, out_size * block), np.nan)
+    padded[:size, :size] = matrix
+    with np.errstate(invalid="ignore"):
+        reduced = np.nanmean(padded.reshape(out_size, block, out_size, block), axis=(1, 3))
+    return block, reduced
+
+def build_covariance(file_path: str, kind: str, index: int,
+                     progress: Callable[[float], None] | None = None) -> dict:
+    data = open_dataset(file_path).data(kind, index)
+    return compute_covariance(data, progress)
+
+def get_covariance(file_path: str, kind: str, index: int) -> dict:
+    """
+    Cached covariance of the slopes (x then y for every subaperture) or commands of one sensor or loop.
+    """
+    return get_or_compute(file_path, ("covariance", kind, index), lambda: build_covariance(file_path, kind, index))
+
+async def serve_covariance(request: Request, file_path: str, kind: str, form) -> Response:
+    """
+    Shared handler of the /slope and /command covariance routes. `matrix` picks
+    covariance or correlation, `max_size` block-averages the matrix down for display,
+    and `encoding` is any of the frame encodings (float32 gives the raw buffer).
+    """
+    matrix = form.get("matrix", "covariance")
+    if matrix not in ("covariance", "correlation"):
+        raise HTTPException(status_code=400, detail=f"Invalid matrix: {matrix}")
+    try:
+        index = int(form.get("index", 0))
+        max_size = form.get("max_size")
+        max_size = int(max_size) if max_size not in (None, "") else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid index or max_size format")
+    if max_size is not None and max_size <= 0:
+        raise HTTPException(status_code=400, detail="max_size must be positive")
+
+    try:
+        cached = await run_in_threadpool(get_covariance, file_path, kind, index)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Covariance error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute covariance")
+
+    values = cached["covariance"] if matrix == "covariance" else correlation_from_covariance(cached["covariance"])
+    block = 1
+    if max_size is not None:
+        block, values = decimate_matrix(values, max_size)
+
+    response = array_response(request, form, {"matrix": values})
+    response.headers["X-Covariance-Frames"] = str(cached["count"])
+    response.headers["X-Covariance-Block"] = str(block)
+    return response
@@ -0,0 +1,123 @@
+import numpy as np
+from fastapi import HTTPException
+
+from .dataset_cache import get_or_compute
+from .encoding import dataset_value_range
+
+KINDS = ("pixel", "slope", "command")
+
+class Dataset:
+    """
+    An opened AOT file, shared by every request on the same dataset.
+
+    Each data kind is exposed as a flat (frame x index) view, the layout the
+    timeline tiles are cut from:
+    - pixel: pixel_intensities [frame][col][row] flattened to [frame][col * num_rows + row]
+    - slope: measurements [frame][x/y][subaperture] as [x/y][frame][subaperture]
+    - command: commands [frame][actuator] as is
+    """
+    def __init__(self, file_path: str):
+        import aotpy  # deferred: loaded by the startup warm-up, not at import time
+
+        self.file_path = file_path
+        self.system = aotpy.AOSystem.read_from_file(file_path)
+
+    def data(self, kind: str, index: int) -> np.ndarray:
+        """
+        The raw array of a data kind for one sensor or loop.
+        """
+        if kind == "command":
+            loops = self.system.loops
+            if not (0 <= index < len(loops)):
+                raise HTTPException(status_code=400, detail=f"loop_index {index} out of range")
+            return loops[index].commands.data
+
+        wfs_list = self.system.wavefront_sensors
+        if not (0 <= index < len(wfs_list)):
+            raise HTTPException(status_code=400, detail=f"wfs_index {index} out of range")
+        if kind == "pixel":
+            return wfs_list[index].detector.pixel_intensities.data
+        if kind == "slope":
+            return wfs_list[index].measurements.data
+        raise HTTPException(status_code=400, detail=f"Invalid data kind: {kind}")
+
+    def extent(self, kind: str, index: int) -> tuple[int, int]:
+        """
+        (num_frames, num_indices) of the flat view.
+        """
+        data = self.data(kind, index)
+        return data.shape[0], int(np.prod(data.shape[1:], dtype=np.int64)) // (2 if kind == "slope" else 1)
+
+    def value_range(self, kind: str, index: int) -> tuple[float, float]:
+        return dataset_value_range(self.file_path, kind, index, self.data(kind, index))
+
+    def flat_view(self, kind: str, index: int) -> np.ndarray:
+        """
+        The flat (frame x index) view of a data kind, or None for pixel data whose
+        memory layout cannot be flattened without copying (see `tile`).
+        Slopes keep a leading x/y axis.
+        """
+        data = self.data(kind, index)
+        if kind == "slope":
+            return np.moveaxis(data, 1, 0)
+        if kind == "pixel":
+            try:
+                return data.reshape(data.shape[0], -1, copy=False)
+            except ValueError:
+                return None
+        return data
+
+    def tile(self, kind: str, index: int, frame_start: int, frame_end: int, index_start: int, index_end: int) -> np.ndarray:
+        """
+        Copy of the flat view over [frame_start, frame_end) x [index_start, index_end), clamped
+        to the data. Rectangular ranges of the view are plain slices; only pixel data that
+        cannot be viewed flat falls back to gathering, and then only the partial rows at
+        either end of the range are gathered separately from the whole rows in between.
+        """
+        num_frames, num_indices = self.extent(kind, index)
+        frames = slice(frame_start, min(frame_end, num_frames))
+        index_end = min(index_end, num_indices)
+        # Clamped like a slice, so a start past the extent gives an empty tile on both paths
+        index_start = min(index_start, index_end)
+
+        view = self.flat_view(kind, index)
+        if view is not None:
+            return np.array(view[..., frames, index_start:index_end])
+
+        data3d = self.data(kind, index)
+        if index_start == index_end:
+            return np.array(data3d[frames, :0, 0])
+        num_rows = data3d.shape[2]
+        col_start, row_start = divmod(index_start, num_rows)
+        col_end, row_end = divmod(index_end, num_rows)
+        if col_start == col_end:
+            return np.array(data3d[frames, col_start, row_start:row_end])
+
+        parts = []
+        if row_start:
+            parts.append(data3d[frames, col_start, row_start:])
+            col_start += 1
+        if col_end > col_start:
+            parts.append(data3d[frames, col_start:col_end, :].reshape(-1, (col_end - col_start) * num_rows))
+        if row_end:
+            parts.append(data3d[frames, col_end, :row_end])
+        return np.concatenate(parts, axis=1)
+
+    def select(self, kind: str, index: int, frame_start: int, frame_end: int, indices: np.ndarray) -> np.ndarray:
+        """
+        Copy of the frames [frame_start, frame_end) at an arbitrary set of flat indices,
+        shaped like the raw data: (frames, indices), or (frames, x/y, indices) for slopes.
+        Pixel indices are gathered from the 3D array, so any memory layout works.
+        """
+        data = self.data(kind, index)
+        frames = slice(frame_start, frame_end)
+        if kind == "pixel":
+            cols, rows = np.divmod(indices, data.shape[2])
+            return data[frames, cols, rows]
+        return data[frames, ..., indices]
+
+def open_dataset(file_path: str) -> Dataset:
+    """
+    The opened dataset for this file, read once and kept until the dataset is evicted.
+    """
+    return get_or_compute(file_path, "dataset", lambda: Dataset(file_path))
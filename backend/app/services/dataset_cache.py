@@ -0,0 +1,166 @@
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, Iterator
+
+# Derived data (statistics, indices, ...) computed from a dataset.
+# Entries are grouped by the dataset file path so they can be dropped together
+# when the session that owns the file goes away.
+_cache: dict[str, dict[Hashable, Any]] = {}
+_lock = threading.Lock()
+# Entries currently being computed, so concurrent callers wait instead of recomputing
+_pending: dict[tuple[str, Hashable], threading.Event] = {}
+# Datasets already evicted; late results from background work on them are discarded
+_evicted: set[str] = set()
+
+# Scratch directories created so far, removed at shutdown if their dataset is never evicted
+_scratch_dirs: set[str] = set()
+
+# Requests currently being served on each dataset; memory pressure leaves those alone
+_in_use: dict[str, int] = {}
+
+# When each dataset's cache was last read or filled, so memory pressure releases the idlest first
+_last_used: dict[str, float] = {}
+
+# Small entries that are slow to rebuild (a pass over the whole file) and survive a release
+RETAINED_ON_RELEASE = ("fingerprint", "content_hash")
+
+# Other caches keyed by dataset (e.g. the tile cache) register here to be evicted together
+_evict_listeners: list[Callable[[str], None]] = []
+# ... and here to be released together under memory pressure
+_release_listeners: list[Callable[[str], None]] = []
+
+def get_cached(file_path: str, key: Hashable) -> Any:
+    """
+    Return the cached value for `key` on this dataset, or None if it was never computed.
+    """
+    with _lock:
+        _last_used[file_path] = time.monotonic()
+        return _cache.get(file_path, {}).get(key)
+
+def get_or_compute(file_path: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+    """
+    Return the cached value for `key` on this dataset, computing and storing it on a miss.
+
+    Only one caller computes a given entry at a time; others asking for it meanwhile
+    (e.g. a request racing a background ingestion job) wait for that result instead
+    of repeating the work.
+    """
+    while True:
+        with _lock:
+            _last_used[file_path] = time.monotonic()
+            entries = _cache.get(file_path, {})
+            if key in entries:
+                return entries[key]
+            pending = _pending.get((file_path, key))
+            owner = pending is None
+            if owner:
+                pending = _pending[(file_path, key)] = threading.Event()
+
+        if not owner:
+            # If the owner fails, the entry is still missing and the next pass computes it
+            pending.wait()
+            continue
+
+        try:
+            value = compute()
+            with _lock:
+                if file_path not in _evicted:
+                    _cache.setdefault(file_path, {})[key] = value
+            return value
+        finally:
+            with _lock:
+                _pending.pop((file_path, key), None)
+            pending.set()
+
+def scratch_dir(file_path: str) -> str:
+    """
+    Directory next to the dataset where derived files (memory-mapped indices, ...) are stored.
+    """
+    if file_path in _evicted:
+        raise RuntimeError(f"Dataset {file_path} has been evicted")
+    path = f"{file_path}.derived"
+    os.makedirs(path, exist_ok=True)
+    with _lock:
+        _scratch_dirs.add(path)
+    return path
+
+def remove_scratch_dirs() -> None:
+    """
+    Delete every scratch directory still on disk; called at shutdown, after the jobs stop.
+    """
+    with _lock:
+        paths = list(_scratch_dirs)
+        _scratch_dirs.clear()
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+def on_evict(listener: Callable[[str], None]) -> None:
+    """
+    Register a callback run with the file path whenever a dataset is evicted.
+    """
+    _evict_listeners.append(listener)
+
+def on_release(listener: Callable[[str], None]) -> None:
+    """
+    Register a callback run with the file path whenever a dataset's caches are released.
+    """
+    _release_listeners.append(listener)
+
+@contextmanager
+def dataset_in_use(file_path: str) -> Iterator[None]:
+    """
+    Mark a dataset as being served for the duration of the block.
+    """
+    with _lock:
+        _in_use[file_path] = _in_use.get(file_path, 0) + 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _in_use[file_path] -= 1
+            if not _in_use[file_path]:
+                del _in_use[file_path]
+
+def busy_datasets() -> set[str]:
+    """
+    Datasets with a request in flight or an entry being computed.
+    """
+    with _lock:
+        return set(_in_use) | {file_path for file_path, _ in _pending}
+
+def cached_datasets() -> dict[str, tuple[float, dict[Hashable, Any]]]:
+    """
+    Snapshot of the datasets holding cache entries: file path -> (last used, entries).
+    """
+    with _lock:
+        return {file_path: (_last_used.get(file_path, 0.0), dict(entries)) for file_path, entries in _cache.items()}
+
+def release_dataset(file_path: str) -> None:
+    """
+    Drop the in-memory entries of a dataset that is still in use, to free memory.
+    Unlike `evict_dataset` the scratch files stay, and entries are rebuilt on the next request;
+    the RETAINED_ON_RELEASE entries are kept.
+    """
+    with _lock:
+        entries = _cache.pop(file_path, {})
+        retained = {key: entries[key] for key in RETAINED_ON_RELEASE if key in entries}
+        if retained:
+            _cache[file_path] = retained
+    for listener in _release_listeners:
+        listener(file_path)
+
+def evict_dataset(file_path: str) -> None:
+    """
+    Drop every cached entry derived from this dataset, including its scratch directory.
+    """
+    with _lock:
+        _cache.pop(file_path, None)
+        _last_used.pop(file_path, None)
+        _evicted.add(file_path)
+        _scratch_dirs.discard(f"{file_path}.derived")
+    for listener in _evict_listeners:
+        listener(file_path)
+    shutil.rmtree(f"{file_path}.derived", ignore_errors=True)
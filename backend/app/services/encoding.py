@@ -0,0 +1,151 @@
+import gzip
+import json
+import zlib
+from typing import Iterable, Iterator, Mapping
+import numpy as np
+from fastapi import HTTPException, Request, Response
+
+from .dataset_cache import get_or_compute
+from ..utils import nan_to_none
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+ENCODINGS = ("json", "float32", "float16", "int16", "uint8")
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+# Largest finite float16; larger magnitudes are clipped rather than sent as inf
+FLOAT16_MAX = float(np.finfo(np.float16).max)
+
+# Quantized codes reserved for NaN, outside the range used for values
+NAN_CODES = {"uint8": 255, "int16": -32768}
+
+# Headers describing a binary array body, readable by the browser through CORS
+ARRAY_HEADERS = ["X-Array-Fields", "X-Array-Shape", "X-Array-Dtype", "X-Array-Scale", "X-Array-Offset", "X-Array-Nan"]
+
+def dataset_value_range(file_path: str, kind: str, index: int, data: np.ndarray) -> tuple[float, float]:
+    """
+    Min and max of a whole data kind, ignoring NaNs, computed once per dataset.
+    Used as the quantization range so tiles and frames share one scale.
+    """
+    return get_or_compute(file_path, ("value_range", kind, index), lambda: (float(np.nanmin(data)), float(np.nanmax(data))))
+
+def needs_value_range(form: Mapping) -> bool:
+    """
+    Whether the requested encoding is quantized, and so needs the dataset value range.
+    """
+    return form.get("encoding", "json") in NAN_CODES
+
+def negotiate_content_coding(request: Request) -> str:
+    """
+    Pick the fastest compression the client accepts: zstd (when installed), gzip or identity.
+    """
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("accept-encoding", "").split(",")
+    }
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+def compress(body: bytes, content_coding: str) -> bytes:
+    match content_coding:
+        case "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(body)
+        case "gzip":
+            # Fixed mtime so identical payloads compress to identical bytes (and ETags stay valid)
+            return gzip.compress(body, compresslevel=1, mtime=0)
+        case _:
+            return body
+
+def compress_stream(chunks: Iterable[bytes], content_coding: str) -> Iterator[bytes]:
+    """
+    Incremental `compress` for streamed bodies of unknown length.
+    """
+    if content_coding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        # wbits=31 writes the gzip container
+        compressor = zlib.compressobj(1, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def quantization_scale(encoding: str, value_range: tuple[float, float]) -> tuple[float, float]:
+    """
+    `scale` and `offset` of the codes `quantize` produces for a value range.
+    """
+    vmin, vmax = value_range
+    levels, offset = (254, vmin) if encoding == "uint8" else (65534, (vmin + vmax) / 2)
+    return ((vmax - vmin) / levels if vmax > vmin else 1.0), offset
+
+def quantize(values: np.ndarray, encoding: str, value_range: tuple[float, float]) -> tuple[np.ndarray, float, float]:
+    """
+    Map `values` onto integer codes so that `value = code * scale + offset`.
+    NaNs are stored as the reserved code in NAN_CODES.
+    """
+    scale, offset = quantization_scale(encoding, value_range)
+    low, high = (0, 254) if encoding == "uint8" else (-32767, 32767)
+
+    nans = np.isnan(values)
+    with np.errstate(invalid="ignore"):
+        codes = np.clip(np.rint((values - offset) / scale), low, high)
+    codes[nans] = NAN_CODES[encoding]
+    return codes.astype("<u1" if encoding == "uint8" else "<i2"), scale, offset
+
+def array_response(request: Request, form: Mapping, arrays: dict[str, np.ndarray], value_range: tuple[float, float] | None = None) -> Response:
+    """
+    Serialise the arrays of a frame or tile route in the requested `encoding`.
+
+    json (default) keeps the existing payload, with NaN as null. The binary
+    encodings send the arrays stacked in order as one little-endian buffer,
+    described by the X-Array-* headers; quantized encodings use `value_range`
+    (or the arrays' own range when not given). float16 clips values beyond
+    its largest finite value (±65504) instead of overflowing them to inf.
+    Either way the body is compressed according to Accept-Encoding.
+    """
+    encoding = form.get("encoding", "json")
+    if encoding not in ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"Invalid encoding: {encoding}")
+
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding == "json":
+        body = json.dumps({name: nan_to_none(values) for name, values in arrays.items()}, separators=(",", ":")).encode()
+        media_type = "application/json"
+    else:
+        values = [np.asarray(values, dtype=np.float64) for values in arrays.values()]
+        stacked = values[0] if len(values) == 1 else np.stack(values)
+        headers["X-Array-Fields"] = ",".join(arrays)
+        headers["X-Array-Shape"] = ",".join(str(n) for n in stacked.shape)
+
+        if encoding in NAN_CODES:
+            if value_range is None:
+                value_range = (float(np.nanmin(stacked)), float(np.nanmax(stacked))) if np.isfinite(stacked).any() else (0.0, 0.0)
+            stacked, scale, offset = quantize(stacked, encoding, value_range)
+            headers["X-Array-Scale"] = repr(scale)
+            headers["X-Array-Offset"] = repr(offset)
+            headers["X-Array-Nan"] = str(NAN_CODES[encoding])
+        else:
+            if encoding == "float16":
+                stacked = np.clip(stacked, -FLOAT16_MAX, FLOAT16_MAX)
+            stacked = stacked.astype("<f4" if encoding == "float32" else "<f2")
+
+        headers["X-Array-Dtype"] = stacked.dtype.str
+        body = np.ascontiguousarray(stacked).tobytes()
+        media_type = "application/octet-stream"
+
+    if len(body) >= MIN_COMPRESS_BYTES:
+        content_coding = negotiate_content_coding(request)
+        if content_coding != "identity":
+            body = compress(body, content_coding)
+            headers["Content-Encoding"] = content_coding
+
+    return Response(content=body, media_type=media_type, headers=headers)
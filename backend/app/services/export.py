@@ -0,0 +1,149 @@
+import io
+from typing import Iterator, Mapping
+import numpy as np
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from .dataset import KINDS, Dataset, open_dataset
+from ..utils import parse_indices
+
+EXPORT_FORMATS = ("npy", "csv", "fits")
+
+# Bytes of selected data read from the dataset per chunk of frames
+EXPORT_CHUNK_BYTES = 8 * 1024 * 1024
+
+FITS_BLOCK = 2880
+
+# FITS BITPIX of the dtypes written as is; anything else is exported as float64
+FITS_BITPIX = {"f8": -64, "f4": -32, "i8": 64, "i4": 32, "i2": 16, "u1": 8}
+
+MEDIA_TYPES = {"npy": "application/octet-stream", "csv": "text/csv", "fits": "application/fits"}
+
+class ExportSelection:
+    """
+    A frame range x index set of one data kind, read back chunk by chunk.
+    """
+    def __init__(self, dataset: Dataset, kind: str, index: int, frame_start: int, frame_end: int, indices: np.ndarray):
+        self.dataset = dataset
+        self.kind = kind
+        self.index = index
+        self.frame_start = frame_start
+        self.frame_end = frame_end
+        self.indices = indices
+
+        data = dataset.data(kind, index)
+        self.dtype = data.dtype
+        self.shape = (frame_end - frame_start, *data.shape[1:-1], len(indices)) if kind == "slope" else (frame_end - frame_start, len(indices))
+
+    @property
+    def values_per_frame(self) -> int:
+        return int(np.prod(self.shape[1:], dtype=np.int64))
+
+    def chunks(self) -> Iterator[tuple[int, np.ndarray]]:
+        """
+        (first frame, block) pairs covering the selection, each block about EXPORT_CHUNK_BYTES.
+        """
+        step = max(1, EXPORT_CHUNK_BYTES // (self.values_per_frame * self.dtype.itemsize))
+        for start in range(self.frame_start, self.frame_end, step):
+            end = min(start + step, self.frame_end)
+            yield start, self.dataset.select(self.kind, self.index, start, end, self.indices)
+
+def npy_header(dtype: np.dtype, shape: tuple[int, ...]) -> bytes:
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape})
+    return buffer.getvalue()
+
+def stream_npy(selection: ExportSelection, dtype: np.dtype) -> Iterator[bytes]:
+    yield npy_header(dtype, selection.shape)
+    for _, block in selection.chunks():
+        yield np.ascontiguousarray(block, dtype=dtype).tobytes()
+
+def csv_columns(selection: ExportSelection) -> list[str]:
+    if selection.kind == "slope":
+        return [f"{axis}{i}" for axis in ("x", "y") for i in selection.indices]
+    return [str(i) for i in selection.indices]
+
+def stream_csv(selection: ExportSelection) -> Iterator[bytes]:
+    yield ("frame," + ",".join(csv_columns(selection)) + "\n").encode()
+    for start, block in selection.chunks():
+        rows = block.reshape(block.shape[0], -1)
+        frames = np.arange(start, start + rows.shape[0])
+        text = io.StringIO()
+        for frame, row in zip(frames, rows):
+            text.write(f"{frame},")
+            text.write(",".join(map(repr, row.tolist())))
+            text.write("\n")
+        yield text.getvalue().encode()
+
+def fits_header(selection: ExportSelection, bitpix: int) -> bytes:
+    from astropy.io import fits
+
+    header = fits.Header()
+    header["SIMPLE"] = True
+    header["BITPIX"] = bitpix
+    # FITS axes run fastest first, the reverse of numpy's shape
+    header["NAXIS"] = len(selection.shape)
+    for axis, length in enumerate(reversed(selection.shape), start=1):
+        header[f"NAXIS{axis}"] = length
+    header["DATAKIND"] = (selection.kind, "AOTrack data kind")
+    header["DATAIDX"] = (selection.index, "wavefront sensor or loop index")
+    header["FRSTART"] = (selection.frame_start, "first exported frame")
+    header["FREND"] = (selection.frame_end, "end of exported frames (exclusive)")
+    return header.tostring().encode("ascii")
+
+def stream_fits(selection: ExportSelection, header: bytes, dtype: np.dtype) -> Iterator[bytes]:
+    yield header
+    written = 0
+    for _, block in selection.chunks():
+        body = np.ascontiguousarray(block, dtype=dtype).tobytes()
+        written += len(body)
+        yield body
+    yield bytes(-written % FITS_BLOCK)
+
+def export_response(file_path: str, form: Mapping) -> StreamingResponse:
+    """
+    Stream a frame range x index set of pixels, slopes or commands as .npy, CSV or a
+    trimmed single-HDU FITS file. The selection is read and written one chunk of frames
+    at a time, so the whole export is never held in memory.
+    """
+    kind = form.get("kind")
+    if kind not in KINDS:
+        raise HTTPException(status_code=400, detail=f"Invalid data kind: {kind}")
+    export_format = form.get("format", "npy")
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format: {export_format}")
+    try:
+        index = int(form.get("index", 0))
+        frame_start = int(form.get("frame_start", 0))
+        frame_end = form.get("frame_end")
+        frame_end = int(frame_end) if frame_end not in (None, "") else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid index or frame range format")
+
+    dataset = open_dataset(file_path)
+    num_frames, num_indices = dataset.extent(kind, index)
+    frame_end = num_frames if frame_end is None else min(frame_end, num_frames)
+    if not (0 <= frame_start < frame_end):
+        raise HTTPException(status_code=400, detail="Invalid frame range")
+
+    indices = parse_indices(form.get("indices"), num_indices)
+    selection = ExportSelection(dataset, kind, index, frame_start, frame_end, indices)
+    filename = f"{kind}-{index}-{frame_start}-{frame_end}.{export_format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    num_values = int(np.prod(selection.shape, dtype=np.int64))
+
+    if export_format == "npy":
+        dtype = selection.dtype.newbyteorder("<")
+        headers["Content-Length"] = str(len(npy_header(dtype, selection.shape)) + num_values * dtype.itemsize)
+        body = stream_npy(selection, dtype)
+    elif export_format == "csv":
+        body = stream_csv(selection)
+    else:
+        code = selection.dtype.str[1:]
+        dtype = np.dtype(">" + code) if code in FITS_BITPIX else np.dtype(">f8")
+        header = fits_header(selection, FITS_BITPIX[dtype.str[1:]])
+        data_bytes = num_values * dtype.itemsize
+        headers["Content-Length"] = str(len(header) + data_bytes + (-data_bytes % FITS_BLOCK))
+        body = stream_fits(selection, header, dtype)
+
+    return StreamingResponse(body, media_type=MEDIA_TYPES[export_format], headers=headers)
@@ -0,0 +1,191 @@
+from typing import Iterator, Mapping
+import numpy as np
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from .binning import FrameWindow, parse_frame_window
+from .dataset import Dataset, open_dataset
+from .encoding import NAN_CODES, compress_stream, dataset_value_range, negotiate_content_coding, quantization_scale, quantize
+from .stat_maps import frames_per_chunk, scatter_to_grid, subaperture_cells
+
+DELTA_MODES = ("auto", "sparse", "dense")
+DEFAULT_KEYFRAME_INTERVAL = 50
+MAX_SEQUENCE_FRAMES = 5000
+
+# Dense deltas are taken modulo the code width, on the unsigned view of the codes
+UNSIGNED_DTYPES = {"uint8": "<u1", "int16": "<u2"}
+
+RECORD_TYPES = {"key": b"\x00", "sparse": b"\x01", "dense": b"\x02"}
+
+FIELDS = {"pixel": ["frame"], "slope": ["frameX", "frameY"], "command": ["frame"]}
+
+# Headers of a sequence body beyond the X-Array-* ones, readable by the browser through CORS
+SEQUENCE_HEADERS = ["X-Sequence-Frames", "X-Sequence-Keyframe-Interval"]
+
+class FrameSource:
+    """
+    The frames a get-frame route would draw for one sensor or loop, produced as
+    (frames x fields x height x width) stacks over a frame range: the pixel image,
+    the slope X/Y maps or the command surface, windowed and binned like get-frame.
+    """
+    def __init__(self, dataset: Dataset, kind: str, index: int, window: FrameWindow):
+        self.kind = kind
+        self.window = window
+        self.data = dataset.data(kind, index)
+        if kind == "slope":
+            mask = dataset.system.wavefront_sensors[index].subaperture_mask.data
+            self.grid_shape = mask.shape
+            self.cells = subaperture_cells(mask)
+        elif kind == "command":
+            # Only the surface inside the region of interest is reconstructed
+            influence_function = window.crop(dataset.system.loops[index].commanded_corrector.influence_function.data)
+            self.surface_shape = influence_function.shape[1:]
+            self.influence_matrix = influence_function.reshape(influence_function.shape[0], -1)
+
+    def frames(self, start: int, end: int) -> np.ndarray:
+        if self.kind == "pixel":
+            stack = self.window.apply(np.asarray(self.data[start:end], dtype=np.float64))
+            return stack[:, None]
+        if self.kind == "slope":
+            grid = scatter_to_grid(np.asarray(self.data[start:end], dtype=np.float64), self.grid_shape, self.cells)
+            return self.window.apply(grid)
+        surfaces = np.asarray(self.data[start:end], dtype=np.float64) @ self.influence_matrix
+        return self.window.bin(surfaces.reshape(end - start, *self.surface_shape))[:, None]
+
+    def chunks(self, frame_start: int, frame_end: int) -> Iterator[np.ndarray]:
+        step = frames_per_chunk(self.frames(frame_start, frame_start + 1))
+        for start in range(frame_start, frame_end, step):
+            yield self.frames(start, min(start + step, frame_end))
+
+def encode_records(source: FrameSource, frame_start: int, frame_end: int, encoding: str,
+                   value_range: tuple[float, float], keyframe_interval: int, delta: str) -> Iterator[bytes]:
+    """
+    Quantize every frame with one shared scale and yield the binary records of each chunk:
+    a keyframe at the start and at every multiple of `keyframe_interval`, and in between
+    only what changed since the previous frame. Each record is a type byte followed by
+    the full codes (key), a <u4 count with the flat <u4 positions and new codes of the
+    changed cells (sparse), or the code differences of the whole frame (dense). Dense
+    differences wrap around at the width of the codes: the client adds them to the
+    previous codes as unsigned integers of that width. `auto` sends sparse records when
+    they are smaller than a keyframe and keyframes otherwise; a dense record is never
+    smaller than a keyframe, so only an explicit `dense` asks for them.
+    """
+    unsigned = np.dtype(UNSIGNED_DTYPES[encoding])
+    previous = None
+    base = frame_start
+    for stack in source.chunks(frame_start, frame_end):
+        codes, _, _ = quantize(stack, encoding, value_range)
+        codes = codes.reshape(len(codes), -1)
+        first = codes[:1] if previous is None else previous
+        differences = np.diff(np.concatenate([first, codes]).view(unsigned), axis=0)
+        changed = differences != 0
+        counts = changed.sum(axis=1)
+        key_bytes = codes.shape[1] * codes.itemsize
+
+        records = []
+        for i, frame_codes in enumerate(codes):
+            sparse_bytes = 4 + counts[i] * (4 + codes.itemsize)
+            if previous is None or (base + i) % keyframe_interval == 0 or (delta == "auto" and sparse_bytes >= key_bytes):
+                records += [RECORD_TYPES["key"], frame_codes.tobytes()]
+            elif delta == "dense":
+                records += [RECORD_TYPES["dense"], differences[i].tobytes()]
+            else:
+                positions = np.flatnonzero(changed[i])
+                records += [RECORD_TYPES["sparse"], np.array(counts[i], dtype="<u4").tobytes(),
+                            positions.astype("<u4").tobytes(), frame_codes[positions].tobytes()]
+            previous = frame_codes[None]
+        base += len(codes)
+        yield b"".join(records)
+
+def sequence_value_range(file_path: str, kind: str, index: int, source: FrameSource,
+                         frame_start: int, frame_end: int) -> tuple[float, float]:
+    """
+    Quantization range shared by the frames: the dataset range for pixels and slopes,
+    as in get-frame; command surfaces have none, so their range over the sequence is used.
+    """
+    if kind != "command":
+        return source.window.scale_range(dataset_value_range(file_path, kind, index, source.data))
+    low, high = np.inf, -np.inf
+    for stack in source.chunks(frame_start, frame_end):
+        if np.isfinite(stack).any():
+            low, high = min(low, float(np.nanmin(stack))), max(high, float(np.nanmax(stack)))
+    return (low, high) if low <= high else (0.0, 0.0)
+
+def prepare_frame_sequence(file_path: str, kind: str, form: Mapping) -> tuple[dict, Iterator[bytes]]:
+    """
+    Validate a sequence request and resolve its quantization range; returns the
+    response headers and the (lazy) record stream.
+    """
+    encoding = form.get("encoding", "int16")
+    if encoding not in NAN_CODES:
+        raise HTTPException(status_code=400, detail=f"Invalid encoding: {encoding}")
+    delta = form.get("delta", "auto")
+    if delta not in DELTA_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid delta: {delta}")
+    try:
+        index = int(form.get("index", 0))
+        frame_start = int(form.get("frame_start", 0))
+        frame_end = form.get("frame_end")
+        frame_end = int(frame_end) if frame_end not in (None, "") else None
+        keyframe_interval = int(form.get("keyframe_interval", DEFAULT_KEYFRAME_INTERVAL))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid index, frame range or keyframe_interval format")
+    if keyframe_interval <= 0:
+        raise HTTPException(status_code=400, detail="keyframe_interval must be positive")
+    window = parse_frame_window(form)
+
+    dataset = open_dataset(file_path)
+    num_frames = dataset.data(kind, index).shape[0]
+    frame_end = min(num_frames if frame_end is None else frame_end, frame_start + MAX_SEQUENCE_FRAMES)
+    frame_end = min(frame_end, num_frames)
+    if not (0 <= frame_start < frame_end):
+        raise HTTPException(status_code=400, detail="Invalid frame range")
+
+    source = FrameSource(dataset, kind, index, window)
+    value_range = sequence_value_range(file_path, kind, index, source, frame_start, frame_end)
+    scale, offset = quantization_scale(encoding, value_range)
+    headers = {
+        "X-Array-Fields": ",".join(FIELDS[kind]),
+        "X-Array-Shape": ",".join(str(n) for n in source.frames(frame_start, frame_start + 1).shape[1:]),
+        "X-Array-Dtype": np.dtype("<u1" if encoding == "uint8" else "<i2").str,
+        "X-Array-Scale": repr(scale),
+        "X-Array-Offset": repr(offset),
+        "X-Array-Nan": str(NAN_CODES[encoding]),
+        "X-Sequence-Frames": f"{frame_start},{frame_end}",
+        "X-Sequence-Keyframe-Interval": str(keyframe_interval),
+    }
+    records = encode_records(source, frame_start, frame_end, encoding, value_range, keyframe_interval, delta)
+    return headers, records
+
+def logged_records(records: Iterator[bytes]) -> Iterator[bytes]:
+    # Headers are already sent by the time a record fails; log it and cut the body short
+    try:
+        yield from records
+    except Exception as e:
+        print(f"Frame sequence error: {e}")
+        raise
+
+async def serve_frame_sequence(request: Request, file_path: str, kind: str, form: Mapping) -> Response:
+    """
+    Shared handler of the get-frame-sequence routes. The records are streamed as they
+    are encoded, one chunk of frames at a time, described by the X-Array-* and
+    X-Sequence-* headers. At most MAX_SEQUENCE_FRAMES frames are sent per request;
+    the client asks for the next range from the end in X-Sequence-Frames.
+    """
+    try:
+        headers, records = await run_in_threadpool(prepare_frame_sequence, file_path, kind, form)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Frame sequence error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to encode frame sequence")
+
+    headers["Vary"] = "Accept-Encoding"
+    body = logged_records(records)
+    content_coding = negotiate_content_coding(request)
+    if content_coding != "identity":
+        body = compress_stream(body, content_coding)
+        headers["Content-Encoding"] = content_coding
+    # A sync iterator: StreamingResponse draws it on the threadpool
+    return StreamingResponse(body, media_type="application/octet-stream", headers=headers)
@@ -0,0 +1,190 @@
+from typing import Callable
+import numpy as np
+from fastapi import HTTPException
+
+from .dataset import open_dataset
+from .dataset_cache import get_or_compute
+from .stat_maps import frames_per_chunk
+from ..utils import nan_to_none
+
+SUMMARY_FIELDS = ("min", "max", "mean", "rms", "nan_count", "saturated_count")
+
+# Robust z-score of a frame's rms above which the frame is reported as a glitch
+GLITCH_THRESHOLD = 6.0
+
+def default_saturation(kind: str, data: np.ndarray) -> float | None:
+    """
+    Saturation level used when the client does not give one: the full scale of
+    integer detector data. Slopes and commands have no intrinsic limit.
+    """
+    if kind == "pixel" and np.issubdtype(data.dtype, np.integer):
+        return float(np.iinfo(data.dtype).max)
+    return None
+
+def saturated_counts(block: np.ndarray, kind: str, saturation: float) -> np.ndarray:
+    """
+    Saturated values per frame of a (frames x values) block: pixels at or above
+    `saturation`, slopes and commands whose magnitude reaches it.
+    """
+    values = block if kind == "pixel" else np.abs(block)
+    with np.errstate(invalid="ignore"):
+        return (values >= saturation).sum(axis=1)
+
+def count_saturated(data: np.ndarray, kind: str, saturation: float) -> np.ndarray:
+    """
+    Per-frame saturated counts for a client-chosen level, in one streaming pass.
+    """
+    num_frames = data.shape[0]
+    size = int(np.prod(data.shape[1:], dtype=np.int64))
+    counts = np.zeros(num_frames, dtype=np.int64)
+    step = frames_per_chunk(data)
+    for start in range(0, num_frames, step):
+        block = np.asarray(data[start:start + step], dtype=np.float64).reshape(-1, size)
+        counts[start:start + block.shape[0]] = saturated_counts(block, kind, saturation)
+    return counts
+
+def compute_frame_summary(data: np.ndarray, kind: str, saturation: float | None,
+                          progress: Callable[[float], None] | None = None) -> dict[str, np.ndarray]:
+    """
+    One streaming pass over the frames of `data`, reducing every frame to its min, max,
+    mean, rms, NaN count and number of saturated values. Pixels count as saturated at
+    or above `saturation`; slopes and commands when their magnitude reaches it.
+    """
+    num_frames = data.shape[0]
+    size = int(np.prod(data.shape[1:], dtype=np.int64))
+    summary = {
+        "min": np.empty(num_frames),
+        "max": np.empty(num_frames),
+        "mean": np.empty(num_frames),
+        "rms": np.empty(num_frames),
+        "count": np.empty(num_frames, dtype=np.int64),
+        "nan_count": np.empty(num_frames, dtype=np.int64),
+        "saturated_count": np.zeros(num_frames, dtype=np.int64),
+    }
+
+    step = frames_per_chunk(data)
+    for start in range(0, num_frames, step):
+        block = np.asarray(data[start:start + step], dtype=np.float64).reshape(-1, size)
+        end = start + block.shape[0]
+        nans = np.isnan(block)
+        filled = np.where(nans, 0.0, block)
+        count = size - nans.sum(axis=1)
+
+        summary["min"][start:end] = np.fmin.reduce(block, axis=1)
+        summary["max"][start:end] = np.fmax.reduce(block, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            summary["mean"][start:end] = np.where(count > 0, filled.sum(axis=1) / count, np.nan)
+            summary["rms"][start:end] = np.where(count > 0, np.sqrt(np.einsum("ij,ij->i", filled, filled) / count), np.nan)
+        summary["count"][start:end] = count
+        summary["nan_count"][start:end] = size - count
+        if saturation is not None:
+            summary["saturated_count"][start:end] = saturated_counts(block, kind, saturation)
+
+        if progress is not None:
+            progress(end / num_frames)
+
+    return summary
+
+def build_frame_summary(file_path: str, kind: str, index: int, saturation: float | None = None,
+                        progress: Callable[[float], None] | None = None) -> dict:
+    data = open_dataset(file_path).data(kind, index)
+    if saturation is None:
+        saturation = default_saturation(kind, data)
+    return {"summary": compute_frame_summary(data, kind, saturation, progress), "saturation": saturation}
+
+def get_frame_summary(file_path: str, kind: str, index: int, saturation: float | None = None) -> dict:
+    """
+    Per-frame summary of a data kind. Only the default saturation level is cached
+    (the entry filled by background ingestion); any other level reuses that summary
+    and recounts the saturated values on the fly, so clients cannot grow the cache.
+    """
+    cached = get_or_compute(file_path, ("frame_summary", kind, index), lambda: build_frame_summary(file_path, kind, index))
+    if saturation is None or saturation == cached["saturation"]:
+        return cached
+    data = open_dataset(file_path).data(kind, index)
+    summary = dict(cached["summary"], saturated_count=count_saturated(data, kind, saturation))
+    return {"summary": summary, "saturation": saturation}
+
+def downsample_summary(summary: dict[str, np.ndarray], max_points: int) -> tuple[int, dict[str, np.ndarray]]:
+    """
+    Merge consecutive frames into buckets so at most `max_points` remain.
+    Returns the bucket size and the merged summary (min of mins, max of maxes,
+    count-weighted mean and rms, summed counts).
+    """
+    num_frames = len(summary["min"])
+    bucket = max(1, -(-num_frames // max_points))
+    if bucket == 1:
+        return 1, summary
+
+    starts = np.arange(0, num_frames, bucket)
+    count = np.add.reduceat(summary["count"], starts)
+    weights = summary["count"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.add.reduceat(np.nan_to_num(summary["mean"]) * weights, starts) / count
+        rms = np.sqrt(np.add.reduceat(np.nan_to_num(summary["rms"]) ** 2 * weights, starts) / count)
+
+    return bucket, {
+        "min": np.fmin.reduceat(summary["min"], starts),
+        "max": np.fmax.reduceat(summary["max"], starts),
+        "mean": np.where(count > 0, mean, np.nan),
+        "rms": np.where(count > 0, rms, np.nan),
+        "count": count,
+        "nan_count": np.add.reduceat(summary["nan_count"], starts),
+        "saturated_count": np.add.reduceat(summary["saturated_count"], starts),
+    }
+
+def find_events(summary: dict[str, np.ndarray], max_events: int) -> list[dict]:
+    """
+    Frames worth jumping to: NaN dropouts, saturations, and glitches whose rms is
+    far from the recording's typical rms (robust z-score over median and MAD).
+    """
+    rms = summary["rms"]
+    median = np.nanmedian(rms) if np.isfinite(rms).any() else np.nan
+    mad = np.nanmedian(np.abs(rms - median)) * 1.4826 if np.isfinite(median) else np.nan
+    with np.errstate(invalid="ignore", divide="ignore"):
+        glitch = np.abs(rms - median) / mad > GLITCH_THRESHOLD if mad > 0 else np.zeros(len(rms), dtype=bool)
+
+    flagged = np.flatnonzero((summary["nan_count"] > 0) | (summary["saturated_count"] > 0) | glitch)
+    events = []
+    for frame in flagged[:max_events]:
+        reasons = []
+        if summary["nan_count"][frame] > 0:
+            reasons.append("nan")
+        if summary["saturated_count"][frame] > 0:
+            reasons.append("saturated")
+        if glitch[frame]:
+            reasons.append("glitch")
+        events.append({"frame": int(frame), "reasons": reasons})
+    return events
+
+def frame_summary_payload(file_path: str, kind: str, form) -> dict:
+    """
+    Shared body of the get-frame-summary routes: the per-frame index downsampled to
+    `max_points` buckets, plus up to `max_events` anomalous frames at full resolution.
+    """
+    try:
+        index = int(form.get("index", 0))
+        max_points = int(form.get("max_points", 2000))
+        max_events = int(form.get("max_events", 1000))
+        saturation = form.get("saturation")
+        saturation = float(saturation) if saturation not in (None, "") else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid summary parameters")
+    if max_points <= 0:
+        raise HTTPException(status_code=400, detail="max_points must be positive")
+    if max_events < 0:
+        raise HTTPException(status_code=400, detail="max_events must not be negative")
+
+    cached = get_frame_summary(file_path, kind, index, saturation)
+    summary = cached["summary"]
+    bucket, downsampled = downsample_summary(summary, max_points)
+
+    response = {
+        "num_frames": len(summary["min"]),
+        "bucket_size": bucket,
+        "saturation": cached["saturation"],
+        "events": find_events(summary, max_events),
+    }
+    for field in SUMMARY_FIELDS:
+        response[field] = nan_to_none(downsampled[field])
+    return response
@@ -0,0 +1,115 @@
+import hashlib
+import os
+from typing import Any, Awaitable, Callable, Mapping
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..session.actions import get_session_from_cookie
+from ..session.manager import SessionData
+from .dataset_cache import get_cached, get_or_compute
+from .encoding import negotiate_content_coding
+
+# Responses addressed by the dataset id never change, so they can be kept forever and shared
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Without the id in the URL the response depends on the session cookie, so only revalidate
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+# Bytes sampled from the start, middle and end of a file for its fingerprint
+SAMPLE_BYTES = 64 * 1024
+
+def dataset_fingerprint(file_path: str) -> str:
+    """
+    Identity of a dataset file, read in constant time whatever its size: SHA-256 of its
+    size, modification time and three sampled blocks. This is the `dataset_id` clients
+    put in URLs, and what ETags are derived from.
+    """
+    def compute():
+        stat = os.stat(file_path)
+        digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        offsets = {0, max(0, stat.st_size // 2 - SAMPLE_BYTES // 2), max(0, stat.st_size - SAMPLE_BYTES)}
+        with open(file_path, "rb") as f:
+            for offset in sorted(offsets):
+                f.seek(offset)
+                digest.update(f.read(SAMPLE_BYTES))
+        return digest.hexdigest()
+
+    return get_or_compute(file_path, "fingerprint", compute)
+
+def content_hash(file_path: str, progress: Callable[[float], None] | None = None) -> str:
+    """
+    SHA-256 of the whole dataset file, computed once per dataset by a background job.
+    """
+    def compute():
+        size = max(os.path.getsize(file_path), 1)
+        digest = hashlib.sha256()
+        read = 0
+        with open(file_path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_BYTES):
+                digest.update(chunk)
+                read += len(chunk)
+                if progress is not None:
+                    progress(read / size)
+        return digest.hexdigest()
+
+    return get_or_compute(file_path, "content_hash", compute)
+
+def cached_content_hash(file_path: str) -> str | None:
+    """
+    The content hash if its job has finished, else None.
+    """
+    return get_cached(file_path, "content_hash")
+
+def make_etag(dataset_hash: str, path: str, params: Mapping[str, str]) -> str:
+    """
+    Strong ETag for a response derived from the dataset content and the request parameters.
+    """
+    digest = hashlib.sha256(dataset_hash.encode())
+    digest.update(path.encode())
+    for key, value in sorted(params.items()):
+        digest.update(f"\0{key}={value}".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def cacheable_response(request: Request, build: Callable[[Request, SessionData, Mapping], Awaitable[dict[str, Any] | Response]]) -> Response:
+    """
+    Serve a GET data route with an ETag and Cache-Control, answering 304 when the client
+    already holds the response. `build` receives the request, the session and the query
+    parameters (in the same shape as the form of the matching POST route) and returns
+    either a JSON payload or a ready response.
+
+    Passing `dataset=<dataset_id>` in the query (as returned by /upload and /session)
+    makes the URL itself identify the data, so the response is marked immutable and public
+    and does not vary on the session cookie; it can be shared by browsers and reverse proxies.
+    """
+    session = await get_session_from_cookie(request)
+    if session is None or session.file_path is None:
+        raise HTTPException(status_code=400, detail="No active session or file path")
+
+    params = request.query_params
+    dataset_hash = await run_in_threadpool(dataset_fingerprint, session.file_path)
+    requested = params.get("dataset")
+    if requested is not None and requested != dataset_hash:
+        raise HTTPException(status_code=409, detail="Requested dataset does not match the active session")
+
+    # Compressed and uncompressed bodies are different representations, so they get different tags
+    etag = make_etag(dataset_hash, request.url.path, {**params, "content-coding": negotiate_content_coding(request)})
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if requested is not None else REVALIDATE_CACHE_CONTROL,
+        "Vary": "Accept-Encoding" if requested is not None else "Cookie, Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    result = await build(request, session, params)
+    if isinstance(result, Response):
+        result.headers.update(headers)
+        return result
+    return JSONResponse(result, headers=headers)
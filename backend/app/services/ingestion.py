@@ -0,0 +1,111 @@
+import os
+from typing import Any, Callable
+import numpy as np
+
+from .dataset import open_dataset
+from .dataset_cache import get_or_compute
+from .http_cache import content_hash
+from .jobs import Job, scheduler
+
+# Priority of the validation job; derived-data steps register their own (lower runs first)
+VALIDATE_PRIORITY = 0
+# The full content hash is a pass over the whole file that no view waits for, so it runs last
+CONTENT_HASH_PRIORITY = 100
+
+# Also precompute the lazy steps after every upload instead of on first request
+EAGER_INGESTION = os.environ.get("AOTRACK_EAGER_INGESTION") == "1"
+
+class IngestionStep:
+    """
+    Derived data precomputed for every uploaded dataset, e.g. the pixel stat maps.
+
+    `available(system)` says, per sensor or loop index, whether the data exists;
+    `build(file_path, system, index, progress)` computes the value that the
+    routes look up in the dataset cache under `(cache_name, kind, index)`.
+    Steps that are not `eager` are left to the first request that needs them.
+    """
+    def __init__(self, name: str, priority: int, cache_name: str, kind: str,
+                 available: Callable[[Any], list[bool]], build: Callable[..., Any], eager: bool = True):
+        self.name = name
+        self.priority = priority
+        self.cache_name = cache_name
+        self.kind = kind
+        self.available = available
+        self.build = build
+        self.eager = eager
+
+    def run(self, file_path: str, system, job: Job) -> None:
+        indices = [i for i, ok in enumerate(self.available(system)) if ok]
+        for n, index in enumerate(indices):
+            def progress(fraction, n=n):
+                job.report((n + fraction) / len(indices))
+
+            get_or_compute(
+                file_path,
+                (self.cache_name, self.kind, index),
+                lambda index=index, progress=progress: self.build(file_path, system, index, progress),
+            )
+
+_steps: list[IngestionStep] = []
+
+def register_ingestion_step(name: str, priority: int, cache_name: str, kind: str,
+                            available: Callable[[Any], list[bool]], build: Callable[..., Any], eager: bool = True) -> None:
+    """
+    Add a step to the pipeline run after every upload. Called by the route modules
+    that own the derived data, so the jobs fill exactly the cache entries they read.
+    Steps whose output scales with the pixel cube pass `eager=False`.
+    """
+    _steps.append(IngestionStep(name, priority, cache_name, kind, available, build, eager))
+
+def validate_system(system) -> list[str]:
+    """
+    Check that the arrays the viewer relies on have consistent shapes.
+    Returns a list of human readable problems, empty when everything checks out.
+    """
+    problems = []
+    for i, sensor in enumerate(system.wavefront_sensors):
+        measurements = sensor.measurements.data if sensor.measurements is not None else None
+        if measurements is not None and (measurements.ndim != 3 or measurements.shape[1] != 2):
+            problems.append(f"wfs {i}: measurements should be [frame][x/y][subaperture], got {measurements.shape}")
+        mask = getattr(sensor, "subaperture_mask", None)
+        if mask is not None and measurements is not None and measurements.ndim == 3:
+            if mask.data.ndim != 2:
+                problems.append(f"wfs {i}: subaperture mask should be 2D, got {mask.data.shape}")
+            elif np.max(mask.data) >= measurements.shape[2]:
+                problems.append(f"wfs {i}: subaperture mask refers to more subapertures than were measured")
+        detector = sensor.detector
+        if detector is not None and detector.pixel_intensities is not None and detector.pixel_intensities.data.ndim != 3:
+            problems.append(f"wfs {i}: pixel intensities should be [frame][col][row], got {detector.pixel_intensities.data.shape}")
+
+    for i, loop in enumerate(system.loops):
+        commands = loop.commands.data if getattr(loop, "commands", None) is not None else None
+        if commands is None:
+            continue
+        if commands.ndim != 2:
+            problems.append(f"loop {i}: commands should be [frame][actuator], got {commands.shape}")
+            continue
+        influence = getattr(loop.commanded_corrector, "influence_function", None)
+        if influence is not None and (influence.data.ndim != 3 or influence.data.shape[0] != commands.shape[1]):
+            problems.append(f"loop {i}: influence function {influence.data.shape} does not match {commands.shape[1]} actuators")
+    return problems
+
+def start_ingestion(file_path: str) -> Job:
+    """
+    Queue the background pipeline for a freshly uploaded dataset: validate it, then
+    precompute every eager step (every step with AOTRACK_EAGER_INGESTION=1).
+    Jobs are cancelled when the dataset is evicted.
+    """
+    def validate(job: Job):
+        system = open_dataset(file_path).system
+        problems = validate_system(system)
+        job.report(1.0)
+
+        # The derived-data jobs share the opened dataset with the routes
+        for step in sorted(_steps, key=lambda step: step.priority):
+            if not (step.eager or EAGER_INGESTION):
+                continue
+            scheduler.submit(file_path, step.name, lambda job, step=step: step.run(file_path, system, job), step.priority)
+        scheduler.submit(file_path, "content hash", lambda job: content_hash(file_path, job.report), CONTENT_HASH_PRIORITY)
+        return {"problems": problems}
+
+    return scheduler.submit(file_path, "validate", validate, VALIDATE_PRIORITY)
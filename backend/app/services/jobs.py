@@ -0,0 +1,167 @@
+import itertools
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import datetime as dt
+from typing import Any, Callable
+from uuid import uuid4
+
+from .dataset_cache import on_evict
+
+# Worker threads for background jobs; numpy releases the GIL for the heavy parts
+NUM_WORKERS = 2
+# How long an idle worker waits for interactive requests to finish before re-checking (seconds)
+INTERACTIVE_BACKOFF = 0.05
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """
+    A unit of background work on one dataset (e.g. building its stat maps).
+
+    The work function receives the job and calls `job.report(fraction)` as it
+    goes, which both publishes progress and is where a cancelled job stops.
+    """
+    def __init__(self, file_path: str, name: str, priority: int, work: Callable[["Job"], Any]):
+        self.id = str(uuid4())
+        self.file_path = file_path
+        self.name = name
+        self.priority = priority
+        self.work = work
+        self.status = "queued"
+        self.progress = 0.0
+        self.error: str | None = None
+        self.result: Any = None
+        self.created_at = datetime.now(dt.UTC)
+        self._cancelled = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        if self.status == "queued":
+            self.status = "cancelled"
+
+    def report(self, fraction: float) -> None:
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self.progress = min(max(fraction, 0.0), 1.0)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "result": self.result,
+        }
+
+class JobScheduler:
+    """
+    Priority queue of background jobs served by a small pool of worker threads.
+
+    Lower priority values run first. Workers do not pick up new jobs while
+    interactive requests are in flight, so background work only uses the
+    gaps between them; jobs already running carry on.
+    """
+    def __init__(self, num_workers: int = NUM_WORKERS):
+        self.num_workers = num_workers
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._jobs: dict[str, list[Job]] = {}
+        self._lock = threading.Lock()
+        self._workers: list[threading.Thread] = []
+        self._interactive = 0
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def start(self) -> None:
+        for i in range(self.num_workers - len(self._workers)):
+            worker = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            jobs = [job for jobs in self._jobs.values() for job in jobs]
+        for job in jobs:
+            job.cancel()
+        for _ in self._workers:
+            self._queue.put((float("inf"), next(self._sequence), None))
+        self._workers.clear()
+
+    def submit(self, file_path: str, name: str, work: Callable[[Job], Any], priority: int = 10) -> Job:
+        job = Job(file_path, name, priority, work)
+        with self._lock:
+            self._jobs.setdefault(file_path, []).append(job)
+        self._queue.put((priority, next(self._sequence), job))
+        return job
+
+    def jobs_for(self, file_path: str) -> list[Job]:
+        with self._lock:
+            return list(self._jobs.get(file_path, []))
+
+    def cancel_dataset(self, file_path: str) -> None:
+        with self._lock:
+            jobs = self._jobs.pop(file_path, [])
+        for job in jobs:
+            job.cancel()
+
+    @contextmanager
+    def interactive(self):
+        """
+        Mark an interactive request as in flight for the duration of the block.
+        """
+        with self._lock:
+            self._interactive += 1
+            self._idle.clear()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._interactive -= 1
+                if self._interactive == 0:
+                    self._idle.set()
+
+    def _run(self) -> None:
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            if job.finished:
+                continue
+
+            while not self._idle.wait(INTERACTIVE_BACKOFF):
+                if job._cancelled.is_set():
+                    break
+
+            self._execute(job)
+
+    def _execute(self, job: Job) -> None:
+        if job._cancelled.is_set():
+            job.status = "cancelled"
+            return
+
+        job.status = "running"
+        started = time.perf_counter()
+        try:
+            job.result = job.work(job)
+            job.progress = 1.0
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            print(f"Job {job.name} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            print(f"Job {job.name} {job.status} after {time.perf_counter() - started:.2f}s")
+
+scheduler = JobScheduler()
+on_evict(scheduler.cancel_dataset)
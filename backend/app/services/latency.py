@@ -0,0 +1,162 @@
+from typing import Callable
+import numpy as np
+from fastapi import HTTPException
+
+from .covariance import get_covariance
+from .dataset import open_dataset
+from .dataset_cache import get_or_compute
+
+# Principal components of the slopes and of the commands that are cross-correlated
+NUM_COMPONENTS = 8
+DEFAULT_MAX_LAG = 50
+# Shortest FFT segment; longer ones are used for large lags so wrap-around stays negligible
+MIN_SEGMENT = 256
+SIGNALS = ("increments", "commands")
+
+def principal_axes(covariance: np.ndarray, k: int) -> np.ndarray:
+    """
+    (variables x k) whitening projection onto the k leading principal components.
+    """
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1][:k]
+    keep = order[eigenvalues[order] > eigenvalues.max() * 1e-12]
+    return eigenvectors[:, keep] / np.sqrt(eigenvalues[keep])
+
+def segment_length(max_lag: int, num_frames: int) -> int:
+    length = MIN_SEGMENT
+    while length < 8 * max_lag:
+        length *= 2
+    return min(length, num_frames)
+
+def cross_correlation(slopes: np.ndarray, commands: np.ndarray, slope_axes: np.ndarray, slope_mean: np.ndarray,
+                      command_axes: np.ndarray, command_mean: np.ndarray, increments: bool, max_lag: int,
+                      progress: Callable[[float], None] | None = None) -> np.ndarray:
+    """
+    Correlation coefficients between every slope component s_i(t) and command component
+    u_j(t + lag), for lag in [-max_lag, max_lag]: (lags x slope components x command components).
+
+    The recording is cut into segments whose zero-padded FFTs give linear (not circular)
+    cross-correlations; their cross-spectra are summed Welch-style and transformed back
+    once, so the cost grows linearly with the number of frames. With `increments` the
+    command signal is u(t) - u(t-1), which an integrator loop drives directly from the
+    slopes measured `delay` frames earlier.
+    """
+    num_frames = slopes.shape[0]
+    first = 1 if increments else 0
+    length = segment_length(max_lag, num_frames - first)
+    nfft = 2 * length
+    k_s, k_c = slope_axes.shape[1], command_axes.shape[1]
+    spectrum = np.zeros((nfft // 2 + 1, k_s, k_c), dtype=np.complex128)
+    sums_s, sumsq_s = np.zeros(k_s), np.zeros(k_s)
+    sums_c, sumsq_c = np.zeros(k_c), np.zeros(k_c)
+    pairs = np.zeros(2 * max_lag + 1)
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    starts = range(first, num_frames, length)
+    for n, start in enumerate(starts):
+        end = min(start + length, num_frames)
+        s = np.nan_to_num(np.asarray(slopes[start:end], dtype=np.float64).reshape(end - start, -1) - slope_mean)
+        if increments:
+            u = np.diff(np.asarray(commands[start - 1:end], dtype=np.float64), axis=0)
+        else:
+            u = np.asarray(commands[start:end], dtype=np.float64)
+        u = np.nan_to_num(u - command_mean)
+        x = s @ slope_axes
+        y = u @ command_axes
+
+        sums_s += x.sum(axis=0)
+        sumsq_s += (x * x).sum(axis=0)
+        sums_c += y.sum(axis=0)
+        sumsq_c += (y * y).sum(axis=0)
+        pairs += np.maximum(end - start - np.abs(lags), 0)
+
+        fx = np.fft.rfft(x, n=nfft, axis=0)
+        fy = np.fft.rfft(y, n=nfft, axis=0)
+        spectrum += np.einsum("fi,fj->fij", fx.conj(), fy)
+
+        if progress is not None:
+            progress((n + 1) / len(starts))
+
+    # r[lag] = sum_t x(t) y(t + lag); negative lags wrap to the end of the padded transform
+    correlation = np.fft.irfft(spectrum, n=nfft, axis=0)
+    correlation = np.concatenate([correlation[-max_lag:], correlation[:max_lag + 1]]) if max_lag else correlation[:1]
+
+    count = num_frames - first
+    std_s = np.sqrt(np.maximum(sumsq_s / count - (sums_s / count) ** 2, 0))
+    std_c = np.sqrt(np.maximum(sumsq_c / count - (sums_c / count) ** 2, 0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = correlation / pairs[:, None, None] - np.outer(sums_s / count, sums_c / count)
+        return covariance / np.outer(std_s, std_c)
+
+def input_sensor_index(system, loop_index: int) -> int | None:
+    """
+    Index of the wavefront sensor feeding a loop, or None when there is none to find:
+    offload loops are driven by a corrector and have no `input_sensor` at all.
+    """
+    sensor = getattr(system.loops[loop_index], "input_sensor", None)
+    if sensor is None:
+        return None
+    for i, candidate in enumerate(system.wavefront_sensors):
+        if candidate is sensor or candidate.uid == sensor.uid:
+            return i
+    return None
+
+def estimate_latency(file_path: str, loop_index: int, wfs_index: int | None, signal: str, max_lag: int,
+                     progress: Callable[[float], None] | None = None) -> dict:
+    """
+    Effective slope-to-command delay of a loop, compared with the delay it reports.
+    The aggregate coupling at each lag is the mean squared correlation over all pairs of
+    slope and command principal components, so every subaperture and actuator counts.
+    """
+    dataset = open_dataset(file_path)
+    commands = dataset.data("command", loop_index)
+    system = dataset.system
+    if wfs_index is None:
+        wfs_index = input_sensor_index(system, loop_index)
+        if wfs_index is None:
+            raise HTTPException(status_code=400, detail="Loop has no input sensor; pass wfs_index")
+    slopes = dataset.data("slope", wfs_index)
+    if slopes.shape[0] != commands.shape[0]:
+        raise HTTPException(status_code=400, detail="Slopes and commands have different frame counts")
+    if commands.shape[0] < 2 * max_lag + 2:
+        raise HTTPException(status_code=400, detail="Recording too short for max_lag")
+
+    slope_cov = get_covariance(file_path, "slope", wfs_index)
+    command_cov = get_covariance(file_path, "command", loop_index)
+    command_mean = command_cov["mean"]
+    if signal == "increments":
+        num_frames = commands.shape[0]
+        command_mean = (np.asarray(commands[-1], dtype=np.float64) - np.asarray(commands[0], dtype=np.float64)) / (num_frames - 1)
+
+    correlation = cross_correlation(
+        slopes, commands,
+        principal_axes(slope_cov["covariance"], NUM_COMPONENTS), slope_cov["mean"],
+        principal_axes(command_cov["covariance"], NUM_COMPONENTS), command_mean,
+        signal == "increments", max_lag, progress,
+    )
+    coupling = np.nanmean(correlation ** 2, axis=(1, 2))
+    lags = np.arange(-max_lag, max_lag + 1)
+    peak = int(np.nanargmax(coupling[max_lag:])) if np.isfinite(coupling[max_lag:]).any() else None
+
+    loop = system.loops[loop_index]
+    framerate = float(loop.framerate) if getattr(loop, "framerate", None) else None
+    reported = float(loop.delay) if getattr(loop, "delay", None) is not None else None
+    return {
+        "wfs_index": wfs_index,
+        "signal": signal,
+        "lags": lags,
+        "coupling": coupling,
+        "estimated_delay_frames": peak,
+        "estimated_delay_seconds": peak / framerate if peak is not None and framerate else None,
+        "peak_coupling": float(coupling[max_lag + peak]) if peak is not None else None,
+        "reported_delay_frames": reported,
+        "framerate": framerate,
+        "delay_mismatch_frames": peak - reported if peak is not None and reported is not None else None,
+    }
+
+def get_latency(file_path: str, loop_index: int, wfs_index: int | None, signal: str, max_lag: int) -> dict:
+    return get_or_compute(
+        file_path,
+        ("latency", loop_index, wfs_index, signal, max_lag),
+        lambda: estimate_latency(file_path, loop_index, wfs_index, signal, max_lag),
+    )
@@ -0,0 +1,170 @@
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any
+import numpy as np
+
+from .dataset_cache import busy_datasets, cached_datasets, release_dataset
+from .jobs import scheduler
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+except ImportError:  # optional; /proc is read instead
+    psutil = None
+
+# Fraction of the machine's memory the process may hold before dataset caches are released
+SOFT_LIMIT_FRACTION = 0.6
+# Fallback limit when the machine's memory cannot be determined
+DEFAULT_SOFT_LIMIT = 4 * 1024 * 1024 * 1024
+# Minimum seconds between two RSS checks
+CHECK_INTERVAL = 1.0
+# Datasets used more recently than this (seconds) are not released, so one in active use is not reopened on every request
+MIN_IDLE_SECONDS = 5.0
+
+def rss_bytes() -> int:
+    """
+    Resident set size of this process.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS; only the peak is known
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def total_memory_bytes() -> int | None:
+    if psutil is not None:
+        return psutil.virtual_memory().total
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (OSError, ValueError):
+        return None
+
+def array_bytes(value: Any, max_depth: int = 6) -> int:
+    """
+    Bytes of in-memory numpy data reachable from a cached value (dicts, lists, tuples
+    and plain objects are followed). Memory-mapped arrays are not counted: their pages
+    are file backed and the OS reclaims them by itself.
+    """
+    seen = set()
+
+    def walk(obj, depth):
+        if id(obj) in seen or depth > max_depth:
+            return 0
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            # Count the array owning the buffer once, however many views reach it
+            owner = obj
+            while isinstance(owner.base, np.ndarray):
+                owner = owner.base
+            if owner is not obj and id(owner) in seen:
+                return 0
+            seen.add(id(owner))
+            if isinstance(owner, np.memmap) or owner.base is not None:
+                return 0
+            return owner.nbytes
+        if isinstance(obj, dict):
+            return sum(walk(v, depth + 1) for v in obj.values())
+        if isinstance(obj, (list, tuple, set)):
+            return sum(walk(v, depth + 1) for v in obj)
+        if hasattr(obj, "__dict__") and not isinstance(obj, type):
+            return walk(vars(obj), depth + 1)
+        return 0
+
+    return walk(value, 0)
+
+class MemoryManager:
+    """
+    Keeps the process under a soft memory limit by releasing dataset caches, the
+    least recently used dataset first, once the RSS goes over it. Collection is
+    forced only after a release, not on every request.
+
+    Only idle datasets are released: none with a request in flight, an entry being
+    computed, an unfinished job or a use within MIN_IDLE_SECONDS. Memory held by
+    that work is left to it rather than released and rebuilt on every check.
+    """
+    def __init__(self, soft_limit: int | None = None):
+        total = total_memory_bytes()
+        self.soft_limit = soft_limit or (int(total * SOFT_LIMIT_FRACTION) if total else DEFAULT_SOFT_LIMIT)
+        self._last_check = 0.0
+        self._checking = threading.Lock()
+        self.releases = 0
+
+    def due(self) -> bool:
+        """
+        Whether CHECK_INTERVAL has passed since the last check; cheap, for the event loop.
+        """
+        return time.monotonic() - self._last_check >= CHECK_INTERVAL
+
+    def idle_datasets(self) -> list[str]:
+        now = time.monotonic()
+        busy = busy_datasets()
+        by_age = sorted(cached_datasets().items(), key=lambda item: item[1][0])
+        return [
+            file_path for file_path, (last_used, _) in by_age
+            if file_path not in busy
+            and now - last_used >= MIN_IDLE_SECONDS
+            and all(job.finished for job in scheduler.jobs_for(file_path))
+        ]
+
+    def check(self, force: bool = False) -> list[str]:
+        """
+        Release idle datasets, in one pass, until the RSS is back under the soft limit.
+        Returns the file paths released; rate limited to one RSS read per CHECK_INTERVAL.
+        Blocking (it collects garbage): call it on the threadpool from async code.
+        """
+        if not self._checking.acquire(blocking=False):
+            return []
+        try:
+            now = time.monotonic()
+            if not force and now - self._last_check < CHECK_INTERVAL:
+                return []
+            self._last_check = now
+
+            released = []
+            if rss_bytes() <= self.soft_limit:
+                return released
+            for file_path in self.idle_datasets():
+                release_dataset(file_path)
+                released.append(file_path)
+                gc.collect()
+                if rss_bytes() <= self.soft_limit:
+                    break
+            self.releases += len(released)
+            if released:
+                logger.warning("Memory pressure: released caches of %d dataset(s)", len(released))
+            return released
+        finally:
+            self._checking.release()
+
+    def report(self, file_path: str | None = None) -> dict:
+        """
+        RSS, soft limit and the cached array bytes per dataset (only `file_path` when given).
+        """
+        now = time.monotonic()
+        datasets = []
+        for path, (last_used, entries) in cached_datasets().items():
+            if file_path is not None and path != file_path:
+                continue
+            datasets.append({
+                "entries": len(entries),
+                "array_bytes": sum(array_bytes(value) for value in entries.values()),
+                "idle_seconds": round(now - last_used, 1),
+            })
+        return {
+            "rss_bytes": rss_bytes(),
+            "soft_limit_bytes": self.soft_limit,
+            "releases": self.releases,
+            "datasets": datasets,
+        }
+
+memory_manager = MemoryManager()
@@ -0,0 +1,156 @@
+from math import factorial
+from typing import Mapping
+import numpy as np
+from fastapi import HTTPException
+
+from .covariance import get_covariance
+from .dataset import open_dataset
+from .dataset_cache import get_or_compute
+from .stat_maps import frames_per_chunk
+
+BASES = ("zernike", "kl")
+DEFAULT_MODES = 20
+
+def noll_to_zernike(j: int) -> tuple[int, int]:
+    """
+    Radial order n and azimuthal frequency m of the Noll-indexed Zernike j (1 is piston).
+    """
+    n = 0
+    j1 = j - 1
+    while j1 > n:
+        n += 1
+        j1 -= n
+    m = (-1) ** j * ((n % 2) + 2 * ((j1 + ((n + 1) % 2)) // 2))
+    return n, m
+
+def zernike(j: int, rho: np.ndarray, theta: np.ndarray) -> np.ndarray:
+    """
+    Noll-normalised Zernike polynomial j at polar coordinates on the unit disk.
+    """
+    n, m = noll_to_zernike(j)
+    radial = np.zeros_like(rho)
+    for k in range((n - abs(m)) // 2 + 1):
+        coef = (-1) ** k * factorial(n - k) / (factorial(k) * factorial((n + abs(m)) // 2 - k) * factorial((n - abs(m)) // 2 - k))
+        radial += coef * rho ** (n - 2 * k)
+    if m == 0:
+        return np.sqrt(n + 1) * radial
+    angular = np.cos(m * theta) if m > 0 else np.sin(-m * theta)
+    return np.sqrt(2 * (n + 1)) * radial * angular
+
+def valid_pupil(influence_function: np.ndarray) -> np.ndarray:
+    """
+    Pupil cells covered by at least one actuator (not NaN in every influence function).
+    """
+    return ~np.isnan(influence_function).all(axis=0)
+
+def pupil_influence_matrix(influence_function: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (actuators x valid pupil cells) influence matrix with NaN as zero, and the pupil mask.
+    """
+    pupil = valid_pupil(influence_function)
+    matrix = np.nan_to_num(np.asarray(influence_function, dtype=np.float64)[:, pupil])
+    return matrix, pupil
+
+def zernike_projection(influence_function: np.ndarray, n_modes: int) -> np.ndarray:
+    """
+    (actuators x modes) matrix taking a command vector straight to the least-squares
+    Zernike coefficients (Noll 1..n_modes) of the surface it produces over the valid pupil.
+    The disk is centred on the pupil's centroid and reaches its outermost cell.
+    """
+    influence_matrix, pupil = pupil_influence_matrix(influence_function)
+    cols, rows = np.nonzero(pupil)
+    x = cols - cols.mean()
+    y = rows - rows.mean()
+    radius = np.sqrt(x ** 2 + y ** 2).max() + 0.5
+    rho = np.sqrt(x ** 2 + y ** 2) / radius
+    theta = np.arctan2(y, x)
+    modes = np.stack([zernike(j, rho, theta) for j in range(1, n_modes + 1)])
+    return influence_matrix @ np.linalg.pinv(modes)
+
+def kl_projection(influence_function: np.ndarray, covariance: np.ndarray, n_modes: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (actuators x modes) projection onto the Karhunen-Loeve modes of the recorded commands,
+    and each mode's variance.
+
+    KL surfaces are orthonormal over the pupil and have uncorrelated coefficients:
+    with G = F Fᵀ (F the pupil influence matrix) and C the command covariance, they
+    solve the generalised eigenproblem (G C G) v = λ G v, normalised so vᵀ G v = 1.
+    A command c then has coefficients c G v and λ is the coefficient variance.
+    """
+    influence_matrix, _ = pupil_influence_matrix(influence_function)
+    gram = influence_matrix @ influence_matrix.T
+    # A small ridge keeps G positive definite when influence functions are degenerate
+    gram_reg = gram + np.eye(len(gram)) * (np.trace(gram) / len(gram) * 1e-10)
+    lower = np.linalg.cholesky(gram_reg)
+    target = gram @ covariance @ gram
+    inv_lower = np.linalg.inv(lower)
+    eigenvalues, eigenvectors = np.linalg.eigh(inv_lower @ target @ inv_lower.T)
+    order = np.argsort(eigenvalues)[::-1][:n_modes]
+    vectors = inv_lower.T @ eigenvectors[:, order]
+    return gram @ vectors, eigenvalues[order]
+
+def get_projection(file_path: str, loop_index: int, basis: str, n_modes: int) -> dict:
+    """
+    Cached projection of one loop's commands onto `n_modes` modes of `basis`.
+    """
+    def compute():
+        dataset = open_dataset(file_path)
+        dataset.data("command", loop_index)  # validates the loop index
+        influence_function = dataset.system.loops[loop_index].commanded_corrector.influence_function.data
+        if basis == "zernike":
+            return {"projection": zernike_projection(influence_function, n_modes)}
+        covariance = get_covariance(file_path, "command", loop_index)["covariance"]
+        projection, variance = kl_projection(influence_function, covariance, n_modes)
+        return {"projection": projection, "variance": variance}
+
+    return get_or_compute(file_path, ("modal_projection", loop_index, basis, n_modes), compute)
+
+def modal_coefficients(commands: np.ndarray, projection: np.ndarray, frame_start: int, frame_end: int) -> np.ndarray:
+    """
+    (frames x modes) coefficients of commands[frame_start:frame_end], one matmul per chunk.
+    """
+    out = np.empty((frame_end - frame_start, projection.shape[1]))
+    step = frames_per_chunk(commands)
+    for start in range(frame_start, frame_end, step):
+        end = min(start + step, frame_end)
+        out[start - frame_start:end - frame_start] = np.asarray(commands[start:end], dtype=np.float64) @ projection
+    return out
+
+def modal_variance(file_path: str, loop_index: int, basis: str, n_modes: int) -> np.ndarray:
+    """
+    Variance of each mode's coefficient over the recording, diag(Pᵀ C P), from the
+    cached command covariance rather than a pass over the frames.
+    """
+    projection = get_projection(file_path, loop_index, basis, n_modes)
+    if "variance" in projection:
+        return projection["variance"]
+    covariance = get_covariance(file_path, "command", loop_index)["covariance"]
+    p = projection["projection"]
+    return np.einsum("am,ab,bm->m", p, covariance, p)
+
+def parse_modal_form(form: Mapping) -> tuple[int, str, int]:
+    """
+    (loop index, basis, number of modes) of a modal request.
+    """
+    basis = form.get("basis", "zernike")
+    if basis not in BASES:
+        raise HTTPException(status_code=400, detail=f"Invalid basis: {basis}")
+    try:
+        loop_index = int(form.get("index", 0))
+        n_modes = int(form.get("n_modes", DEFAULT_MODES))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid index or n_modes format")
+    if n_modes <= 0:
+        raise HTTPException(status_code=400, detail="n_modes must be positive")
+    return loop_index, basis, n_modes
+
+def bucket_mean(values: np.ndarray, max_points: int) -> tuple[int, np.ndarray]:
+    """
+    Average consecutive rows so at most `max_points` remain; returns the bucket size too.
+    """
+    bucket = max(1, -(-len(values) // max_points))
+    if bucket == 1:
+        return 1, values
+    starts = np.arange(0, len(values), bucket)
+    counts = np.diff(np.append(starts, len(values)))
+    return bucket, np.add.reduceat(values, starts, axis=0) / counts[:, None]
@@ -0,0 +1,151 @@
+import os
+from typing import Callable
+import numpy as np
+
+from .stat_maps import frames_per_chunk
+
+class PrefixIndex:
+    """
+    Cumulative sums along the frame axis of a dataset, stored memory-mapped.
+
+    Row `i` holds the sum over frames `[0, i)`, so any `[start, end)` range is
+    answered with two reads and a subtraction. Sums of squares (only when a std
+    is needed) and NaN counts (only for float data) are kept alongside so ranges
+    can be reduced to a mean or std ignoring NaNs. The sums are taken of the values
+    minus `shift`, a per-element mean of the first frames, so the variance is not
+    lost to cancellation on data with a large offset (e.g. detector pixels).
+    """
+    def __init__(self, sums: np.ndarray, sumsq: np.ndarray | None, nan_counts: np.ndarray | None,
+                 shift: np.ndarray, element_shape: tuple):
+        self.sums = sums
+        self.sumsq = sumsq
+        self.nan_counts = nan_counts
+        self.shift = shift
+        self.element_shape = element_shape
+
+    @property
+    def num_frames(self) -> int:
+        return self.sums.shape[0] - 1
+
+    def _range(self, table: np.ndarray, start: int, end: int) -> np.ndarray:
+        return table[end] - table[start]
+
+    def range_count(self, start: int, end: int) -> np.ndarray:
+        """
+        Number of non-NaN samples per element over frames `[start, end)`.
+        """
+        if self.nan_counts is None:
+            return np.full(self.sums.shape[1], end - start)
+        return (end - start) - self._range(self.nan_counts, start, end)
+
+    def range_mean(self, start: int, end: int) -> np.ndarray:
+        """
+        Mean frame over `[start, end)`, NaN where an element has no valid sample.
+        """
+        count = self.range_count(start, end)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self._range(self.sums, start, end) / count + self.shift
+        return np.where(count > 0, mean, np.nan).reshape(self.element_shape)
+
+    def range_std(self, start: int, end: int) -> np.ndarray:
+        """
+        Population std frame over `[start, end)`, NaN where an element has no valid sample.
+        """
+        if self.sumsq is None:
+            raise ValueError("Prefix index was built without sums of squares")
+        count = self.range_count(start, end)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self._range(self.sums, start, end) / count
+            variance = self._range(self.sumsq, start, end) / count - mean * mean
+        # Differences of large running sums can dip slightly below zero
+        std = np.sqrt(np.clip(variance, 0.0, None))
+        return np.where(count > 0, std, np.nan).reshape(self.element_shape)
+
+def _table_paths(directory: str, name: str, tables: list[str]) -> dict[str, str]:
+    return {table: os.path.join(directory, f"{name}.{table}.npy") for table in tables}
+
+def _open_index(paths: dict[str, str], element_shape: tuple) -> PrefixIndex:
+    tables = {table: np.load(path, mmap_mode="r") for table, path in paths.items()}
+    return PrefixIndex(tables["sums"], tables.get("sumsq"), tables.get("nan_counts"), tables["shift"], element_shape)
+
+def build_prefix_index(data: np.ndarray, directory: str, name: str, progress: Callable[[float], None] | None = None,
+                       with_std: bool = True) -> PrefixIndex:
+    """
+    Build (or reopen) the prefix-sum index of `data` under `directory`.
+
+    The tables are written chunk by chunk into memory-mapped .npy files, so the
+    dataset never has to be held in memory as float64 all at once. Only the tables
+    a caller can read are written: sums of squares when `with_std`, NaN counts when
+    the data can hold NaNs. `progress` is called with the fraction done after each chunk.
+    """
+    element_shape = data.shape[1:]
+    size = int(np.prod(element_shape, dtype=np.int64))
+    names = ["sums", "shift"]
+    if with_std:
+        names.append("sumsq")
+    if np.issubdtype(data.dtype, np.inexact):
+        names.append("nan_counts")
+    paths = _table_paths(directory, name, names)
+
+    if all(os.path.exists(path) for path in paths.values()):
+        return _open_index(paths, element_shape)
+
+    # NaN counts never exceed the frame count
+    count_dtype = np.int32 if data.shape[0] <= np.iinfo(np.int32).max else np.int64
+    dtypes = {"sums": np.float64, "shift": np.float64, "sumsq": np.float64, "nan_counts": count_dtype}
+    partial = {table: f"{path}.partial" for table, path in paths.items()}
+    try:
+        fill_tables(data, partial, dtypes, size, progress)
+    except BaseException:
+        # A cancelled or failed build leaves nothing behind
+        for path in partial.values():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        raise
+
+    # Only publish complete tables, so an interrupted build is never picked up later
+    for table, path in paths.items():
+        os.replace(partial[table], path)
+
+    return _open_index(paths, element_shape)
+
+def fill_tables(data: np.ndarray, partial: dict[str, str], dtypes: dict, size: int,
+                progress: Callable[[float], None] | None) -> None:
+    """
+    Write the running totals of `data` into the memory-mapped tables at the `partial` paths.
+    """
+    num_frames = data.shape[0]
+    tables = {
+        table: np.lib.format.open_memmap(path, mode="w+", dtype=dtypes[table],
+                                         shape=(size,) if table == "shift" else (num_frames + 1, size))
+        for table, path in partial.items()
+    }
+    for table in tables.values():
+        table[0] = 0
+
+    step = frames_per_chunk(data)
+    shift = None
+    for start in range(0, num_frames, step):
+        block = np.asarray(data[start:start + step], dtype=np.float64).reshape(-1, size)
+        end = start + block.shape[0]
+        nans = np.isnan(block)
+        if shift is None:
+            # Mean of the first chunk, or 0 where it is all NaN
+            valid = (~nans).sum(axis=0)
+            shift = np.where(valid > 0, np.where(nans, 0.0, block).sum(axis=0) / np.maximum(valid, 1), 0.0)
+            tables["shift"][:] = shift
+        filled = np.where(nans, 0.0, block - shift)
+
+        tables["sums"][start + 1:end + 1] = tables["sums"][start] + np.cumsum(filled, axis=0)
+        if "sumsq" in tables:
+            tables["sumsq"][start + 1:end + 1] = tables["sumsq"][start] + np.cumsum(filled * filled, axis=0)
+        if "nan_counts" in tables:
+            tables["nan_counts"][start + 1:end + 1] = tables["nan_counts"][start] + np.cumsum(nans, axis=0)
+
+        if progress is not None:
+            progress(end / num_frames)
+
+    for table in tables.values():
+        table.flush()
@@ -0,0 +1,99 @@
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from fastapi import Request
+
+# Directory profiling reports are written to; profiling is off unless this is set
+PROFILE_DIR = os.environ.get("AOTRACK_PROFILE_DIR")
+# Requests carrying this header (with any value but "0") are profiled
+PROFILE_HEADER = "X-Profile"
+# Seconds between two stack samples
+SAMPLE_INTERVAL = 0.005
+# Allocation sites listed in the memory report
+TOP_ALLOCATIONS = 30
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+def profiling_requested(request: Request) -> bool:
+    return PROFILE_DIR is not None and request.headers.get(PROFILE_HEADER, "0") != "0"
+
+class StackSampler(threading.Thread):
+    """
+    Samples the Python stacks of every other thread (the event loop and the threadpool
+    running the route's work) at a fixed interval and counts them in collapsed form,
+    "outer;...;inner count", the input format of flame graph tools.
+    """
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+class RequestProfile:
+    """
+    Allocation and CPU profile of one request: a tracemalloc snapshot diff taken around
+    the request plus the stack samples collected meanwhile, written to PROFILE_DIR as
+    `<name>.memory.txt` and `<name>.stacks.txt`. Overlapping profiled requests share the
+    process-wide tracer, so their reports include each other's work.
+    """
+    def __init__(self, request: Request):
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", request.url.path).strip("-") or "root"
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{request.method.lower()}-{slug}"
+
+    def __enter__(self) -> "RequestProfile":
+        global _tracemalloc_users
+        with _tracemalloc_lock:
+            if _tracemalloc_users == 0:
+                tracemalloc.start()
+            _tracemalloc_users += 1
+        tracemalloc.reset_peak()
+        self.before = tracemalloc.take_snapshot()
+        self.sampler = StackSampler()
+        self.started = time.perf_counter()
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        global _tracemalloc_users
+        self.sampler.stop()
+        elapsed = time.perf_counter() - self.started
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        with _tracemalloc_lock:
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0:
+                tracemalloc.stop()
+        self.write(elapsed, peak, after.compare_to(self.before, "lineno"))
+
+    def write(self, elapsed: float, peak: int, differences) -> None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.name)
+        with open(f"{base}.memory.txt", "w") as f:
+            f.write(f"elapsed {elapsed:.3f} s, traced peak {peak / 1024 / 1024:.1f} MiB\n\n")
+            for stat in differences[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        with open(f"{base}.stacks.txt", "w") as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
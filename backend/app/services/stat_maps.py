@@ -0,0 +1,98 @@
+from typing import Callable
+import numpy as np
+
+# Target size of a single chunk read from the frame axis (bytes, as float64)
+CHUNK_BYTES = 64 * 1024 * 1024
+
+STAT_NAMES = ("min", "max", "mean", "std", "rms")
+
+def frames_per_chunk(data: np.ndarray, chunk_bytes: int = CHUNK_BYTES) -> int:
+    """
+    Number of frames that fit in one chunk of roughly `chunk_bytes`.
+    """
+    frame_size = int(np.prod(data.shape[1:], dtype=np.int64)) or 1
+    return max(1, chunk_bytes // (frame_size * 8))
+
+def compute_stat_maps(data: np.ndarray, progress: Callable[[float], None] | None = None) -> dict[str, np.ndarray]:
+    """
+    Reduce `data` along the frame axis (axis 0) in one chunked pass.
+
+    Returns min, max, mean, std and rms for every element of a frame, with the
+    shape of `data[0]`. NaNs are ignored; elements that are NaN in every frame
+    come out as NaN. `progress` is called with the fraction done after each chunk.
+    """
+    num_frames = data.shape[0]
+    element_shape = data.shape[1:]
+    size = int(np.prod(element_shape, dtype=np.int64))
+
+    count = np.zeros(size, dtype=np.int64)
+    mins = np.full(size, np.nan)
+    maxs = np.full(size, np.nan)
+    mean = np.zeros(size)
+    m2 = np.zeros(size)
+    sumsq = np.zeros(size)
+
+    step = frames_per_chunk(data)
+    for start in range(0, num_frames, step):
+        block = np.asarray(data[start:start + step], dtype=np.float64).reshape(-1, size)
+        valid = ~np.isnan(block)
+        filled = np.where(valid, block, 0.0)
+
+        block_count = valid.sum(axis=0)
+        block_mean = np.divide(filled.sum(axis=0), block_count, out=np.zeros(size), where=block_count > 0)
+        block_m2 = np.where(valid, block - block_mean, 0.0)
+        block_m2 = np.einsum("ij,ij->j", block_m2, block_m2)
+
+        mins = np.fmin(mins, np.fmin.reduce(block, axis=0))
+        maxs = np.fmax(maxs, np.fmax.reduce(block, axis=0))
+        sumsq += np.einsum("ij,ij->j", filled, filled)
+
+        # Chan et al. parallel merge of the running (count, mean, M2) with this chunk
+        total = count + block_count
+        delta = block_mean - mean
+        ratio = np.divide(block_count, total, out=np.zeros(size), where=total > 0)
+        mean += delta * ratio
+        m2 += block_m2 + delta * delta * count * ratio
+        count = total
+
+        if progress is not None:
+            progress(min(start + step, num_frames) / num_frames)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        empty = count == 0
+        mean = np.where(empty, np.nan, mean)
+        std = np.where(empty, np.nan, np.sqrt(m2 / count))
+        rms = np.where(empty, np.nan, np.sqrt(sumsq / count))
+
+    stats = {"min": mins, "max": maxs, "mean": mean, "std": std, "rms": rms}
+    return {name: values.reshape(element_shape) for name, values in stats.items()}
+
+def subaperture_cells(subaperture_mask: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Grid cells of every valid subaperture: (rows, cols, measurement index).
+    """
+    rows, cols = np.where(subaperture_mask != -1)
+    return rows, cols, subaperture_mask[rows, cols]
+
+def actuator_cells(influence_function: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pupil cell where each actuator's influence function peaks: (rows, cols, actuator index).
+    Actuators whose influence function is entirely NaN are left out.
+    """
+    n_actuators = influence_function.shape[0]
+    flat = np.abs(influence_function.reshape(n_actuators, -1))
+    has_data = ~np.isnan(flat).all(axis=1)
+    actuators = np.flatnonzero(has_data)
+    peaks = np.nanargmax(flat[has_data], axis=1)
+    rows, cols = np.unravel_index(peaks, influence_function.shape[1:])
+    return rows, cols, actuators
+
+def scatter_to_grid(values: np.ndarray, shape: tuple[int, int], cells: tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    Place `values[..., index]` at each (row, col) of `cells` on a NaN-filled grid of `shape`.
+    Leading dimensions of `values` (e.g. the slope X/Y axis) are kept.
+    """
+    rows, cols, indices = cells
+    grid = np.full(values.shape[:-1] + tuple(shape), np.nan)
+    grid[..., rows, cols] = values[..., indices]
+    return grid
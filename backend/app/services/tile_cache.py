@@ -0,0 +1,168 @@
+import asyncio
+from collections import OrderedDict
+from typing import Callable
+import numpy as np
+from fastapi import HTTPException, Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from .dataset import open_dataset
+from .dataset_cache import on_evict, on_release
+from .encoding import array_response, needs_value_range
+
+# Upper bound on the memory held by cached tiles
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# Upper bound on speculative loads running at the same time
+MAX_PREFETCH_TASKS = 4
+
+# (file_path, kind, index, frame_start, frame_end, index_start, index_end)
+TileKey = tuple[str, str, int, int, int, int, int]
+# Loads the tile for (frame_start, frame_end, index_start, index_end) and returns it together
+# with the (num_frames, num_indices) extent of the data it was sliced from
+TileLoader = Callable[[int, int, int, int], tuple[np.ndarray, tuple[int, int]]]
+
+class TileCache:
+    """
+    LRU cache of timeline tiles shared by every session in the process.
+
+    Concurrent requests for the same tile share a single load (single-flight),
+    and serving a tile schedules background loads of its neighbours so the
+    timeline can be panned without waiting on the server.
+    """
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._tiles: OrderedDict[TileKey, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self._inflight: dict[TileKey, asyncio.Future] = {}
+        self._extents: dict[tuple[str, str, int], tuple[int, int]] = {}
+        self._prefetch_tasks: set[asyncio.Task] = set()
+
+    async def get(self, key: TileKey, loader: TileLoader) -> np.ndarray:
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = future
+        # Shielded so a client disconnecting does not cancel a load other requests are waiting on
+        return await asyncio.shield(future)
+
+    async def _load(self, key: TileKey, loader: TileLoader) -> np.ndarray:
+        try:
+            tile, extent = await run_in_threadpool(loader, *key[3:])
+            self._extents[key[:3]] = extent
+            self._store(key, tile)
+            return tile
+        finally:
+            self._inflight.pop(key, None)
+
+    def _store(self, key: TileKey, tile: np.ndarray) -> None:
+        if tile.nbytes > self.max_bytes:
+            return
+        self._tiles[key] = tile
+        self._bytes += tile.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._tiles.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def prefetch_neighbours(self, key: TileKey, loader: TileLoader) -> None:
+        """
+        Start background loads of the tiles adjacent to `key` along both axes.
+        """
+        file_path, kind, index, frame_start, frame_end, index_start, index_end = key
+        frame_width = frame_end - frame_start
+        index_width = index_end - index_start
+        extent = self._extents.get(key[:3])
+
+        neighbours = [
+            (frame_start + frame_width, index_start),
+            (frame_start - frame_width, index_start),
+            (frame_start, index_start + index_width),
+            (frame_start, index_start - index_width),
+        ]
+        for start_f, start_i in neighbours:
+            if len(self._prefetch_tasks) >= MAX_PREFETCH_TASKS:
+                return
+            if start_f < 0 or start_i < 0:
+                continue
+            if extent is not None and (start_f >= extent[0] or start_i >= extent[1]):
+                continue
+
+            neighbour = (file_path, kind, index, start_f, start_f + frame_width, start_i, start_i + index_width)
+            if neighbour in self._tiles or neighbour in self._inflight:
+                continue
+
+            task = asyncio.create_task(self._prefetch(neighbour, loader))
+            self._prefetch_tasks.add(task)
+            task.add_done_callback(self._prefetch_tasks.discard)
+
+    async def _prefetch(self, key: TileKey, loader: TileLoader) -> None:
+        try:
+            await self.get(key, loader)
+        except Exception as e:
+            print(f"Tile prefetch failed for {key[1:]}: {e}")
+
+    def evict_dataset(self, file_path: str) -> None:
+        for key in [key for key in self._tiles if key[0] == file_path]:
+            self._bytes -= self._tiles.pop(key).nbytes
+        for key in [key for key in self._extents if key[0] == file_path]:
+            del self._extents[key]
+
+tile_cache = TileCache()
+on_evict(tile_cache.evict_dataset)
+on_release(tile_cache.evict_dataset)
+
+async def get_tile(file_path: str, kind: str, index: int, frame_start: int, frame_end: int,
+                   index_start: int, index_end: int, loader: TileLoader) -> np.ndarray:
+    """
+    Return the requested tile from the shared cache, loading it at most once,
+    and prefetch its neighbours in the background.
+    """
+    key = (file_path, kind, index, frame_start, frame_end, index_start, index_end)
+    tile = await tile_cache.get(key, loader)
+    tile_cache.prefetch_neighbours(key, loader)
+    return tile
+
+def parse_tile_range(form) -> tuple[int, int, int, int, int]:
+    """
+    (index, frame_start, frame_end, index_start, index_end) of a tile request.
+    """
+    try:
+        index = int(form.get("index", 0))
+        frame_start = int(form.get("frame_start"))
+        frame_end = int(form.get("frame_end"))
+        index_start = int(form.get("index_start"))
+        index_end = int(form.get("index_end"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid tile parameters")
+
+    if frame_start < 0 or frame_end <= frame_start:
+        raise HTTPException(status_code=400, detail="Invalid frame range")
+    if index_start < 0 or index_end <= index_start:
+        raise HTTPException(status_code=400, detail="Invalid index range")
+    return index, frame_start, frame_end, index_start, index_end
+
+async def serve_tile(request: Request, file_path: str, kind: str, form) -> Response:
+    """
+    Shared handler of the /pixel, /slope and /command tile routes.
+    """
+    index, frame_start, frame_end, index_start, index_end = parse_tile_range(form)
+
+    def load_tile(frame_start, frame_end, index_start, index_end):
+        dataset = open_dataset(file_path)
+        return dataset.tile(kind, index, frame_start, frame_end, index_start, index_end), dataset.extent(kind, index)
+
+    try:
+        tile = await get_tile(file_path, kind, index, frame_start, frame_end, index_start, index_end, load_tile)
+        value_range = None
+        if needs_value_range(form):
+            value_range = await run_in_threadpool(lambda: open_dataset(file_path).value_range(kind, index))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Tile fetch error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to extract tile")
+
+    return array_response(request, form, {"tile": tile}, value_range)
@@ -0,0 +1,60 @@
+import importlib
+import threading
+import time
+import numpy as np
+
+from .jobs import scheduler
+
+# Imported in the background at startup instead of when the first route needs them
+WARMUP_MODULES = ("aotpy", "astropy.io.fits", "astropy.visualization")
+# Jobs of the warm-up are filed under this key instead of a dataset path
+WARMUP_JOB_KEY = "<warmup>"
+# Seconds to wait for the job workers to pick up the warm-up jobs
+WARMUP_JOB_TIMEOUT = 30.0
+
+class WarmUp:
+    """
+    Startup work done after the server is listening: importing the scientific stack,
+    starting the BLAS threads and running a no-op job per job worker, so both pools have
+    served work. `ready` is set once it has finished, so a readiness probe can hold
+    traffic back from a cold worker.
+    """
+    def __init__(self):
+        self.ready = threading.Event()
+        self.seconds: float | None = None
+        self.error: str | None = None
+
+    def run(self) -> None:
+        started = time.perf_counter()
+        try:
+            for module in WARMUP_MODULES:
+                importlib.import_module(module)
+            # Starts the BLAS thread pool used by the covariance and reconstruction matmuls
+            a = np.ones((64, 64))
+            a @ a
+            self.prime_job_workers()
+        except Exception as e:
+            self.error = str(e)
+            print(f"Warm-up error: {e}")
+        self.seconds = time.perf_counter() - started
+        self.ready.set()
+
+    def prime_job_workers(self) -> None:
+        jobs = [scheduler.submit(WARMUP_JOB_KEY, "warm-up", lambda job: None, priority=-1) for _ in range(scheduler.num_workers)]
+        deadline = time.monotonic() + WARMUP_JOB_TIMEOUT
+        try:
+            while not all(job.finished for job in jobs):
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Job workers did not start")
+                time.sleep(0.01)
+        finally:
+            scheduler.cancel_dataset(WARMUP_JOB_KEY)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready.is_set(),
+            "warmup_seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "error": self.error,
+        }
+
+warmup = WarmUp()
@@ -0,0 +1,194 @@
+from typing import Callable, Mapping
+import numpy as np
+from fastapi import HTTPException
+
+from .dataset import Dataset, open_dataset
+from .dataset_cache import get_or_compute
+from ..utils import parse_indices
+from .stat_maps import frames_per_chunk
+
+# Frames and flat indices summarised by one zone
+FRAME_BLOCK = 256
+INDEX_BLOCK = 64
+
+PREDICATES = ("gt", "ge", "lt", "le", "between", "outside")
+SLOPE_AXES = ("x", "y", "any")
+
+def block_reduce(values: np.ndarray, reduce: np.ufunc) -> np.ndarray:
+    """
+    Reduce an (axes x frames x indices) array over FRAME_BLOCK x INDEX_BLOCK zones,
+    NaN-padding partial blocks; zones that are entirely NaN come out as NaN.
+    """
+    axes, frames, indices = values.shape
+    pad_frames = -frames % FRAME_BLOCK
+    pad_indices = -indices % INDEX_BLOCK
+    if pad_frames or pad_indices:
+        values = np.pad(values, ((0, 0), (0, pad_frames), (0, pad_indices)), constant_values=np.nan)
+    blocks = values.reshape(axes, values.shape[1] // FRAME_BLOCK, FRAME_BLOCK, values.shape[2] // INDEX_BLOCK, INDEX_BLOCK)
+    return reduce.reduce(reduce.reduce(blocks, axis=4), axis=2)
+
+def read_tile(dataset: Dataset, kind: str, index: int, frame_start: int, frame_end: int,
+              index_start: int, index_end: int) -> np.ndarray:
+    """
+    Flat view tile with a leading x/y axis for slopes and a singleton one otherwise.
+    """
+    tile = np.asarray(dataset.tile(kind, index, frame_start, frame_end, index_start, index_end), dtype=np.float64)
+    return tile if kind == "slope" else tile[None]
+
+def build_zone_map(file_path: str, kind: str, index: int, progress: Callable[[float], None] | None = None) -> dict:
+    """
+    Min and max of every FRAME_BLOCK x INDEX_BLOCK zone of the flat (frame x index) view,
+    shaped (axes x frame blocks x index blocks), with one axis per slope component.
+    Read in chunks of whole frame blocks.
+    """
+    dataset = open_dataset(file_path)
+    num_frames, num_indices = dataset.extent(kind, index)
+    axes = 2 if kind == "slope" else 1
+    shape = (axes, -(-num_frames // FRAME_BLOCK), -(-num_indices // INDEX_BLOCK))
+    mins = np.empty(shape)
+    maxs = np.empty(shape)
+
+    step = max(1, frames_per_chunk(dataset.data(kind, index)) // FRAME_BLOCK) * FRAME_BLOCK
+    for start in range(0, num_frames, step):
+        end = min(start + step, num_frames)
+        values = read_tile(dataset, kind, index, start, end, 0, num_indices)
+        blocks = slice(start // FRAME_BLOCK, -(-end // FRAME_BLOCK))
+        mins[:, blocks] = block_reduce(values, np.fmin)
+        maxs[:, blocks] = block_reduce(values, np.fmax)
+        if progress is not None:
+            progress(end / num_frames)
+
+    return {"min": mins, "max": maxs}
+
+def get_zone_map(file_path: str, kind: str, index: int) -> dict:
+    return get_or_compute(file_path, ("zone_map", kind, index), lambda: build_zone_map(file_path, kind, index))
+
+def zone_candidates(mins: np.ndarray, maxs: np.ndarray, predicate: str, low: float, high: float) -> np.ndarray:
+    """
+    Zones that may hold a value satisfying the predicate; all-NaN zones never do.
+    """
+    with np.errstate(invalid="ignore"):
+        if predicate == "gt":
+            return maxs > low
+        if predicate == "ge":
+            return maxs >= low
+        if predicate == "lt":
+            return mins < low
+        if predicate == "le":
+            return mins <= low
+        if predicate == "between":
+            return (maxs >= low) & (mins <= high)
+        return (mins < low) | (maxs > high)
+
+def evaluate(values: np.ndarray, predicate: str, low: float, high: float) -> np.ndarray:
+    with np.errstate(invalid="ignore"):
+        if predicate == "gt":
+            return values > low
+        if predicate == "ge":
+            return values >= low
+        if predicate == "lt":
+            return values < low
+        if predicate == "le":
+            return values <= low
+        if predicate == "between":
+            return (values >= low) & (values <= high)
+        return (values < low) | (values > high)
+
+def frame_ranges(hits: np.ndarray, offset: int) -> list[list[int]]:
+    """
+    [start, end) runs of consecutive True frames, shifted by `offset`.
+    """
+    edges = np.diff(np.concatenate(([0], hits.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return [[int(s) + offset, int(e) + offset] for s, e in zip(starts, ends)]
+
+def search(file_path: str, kind: str, index: int, predicate: str, low: float, high: float, axis: str,
+           frame_start: int, frame_end: int | None, indices: np.ndarray | None) -> dict:
+    """
+    Frames and flat indices where the data satisfies the predicate. Zones whose min/max
+    rule out a match are skipped; each frame block with candidates is read once over the
+    span of its candidate index blocks and tested in one vectorised comparison.
+    """
+    dataset = open_dataset(file_path)
+    num_frames, num_indices = dataset.extent(kind, index)
+    frame_end = num_frames if frame_end is None else min(frame_end, num_frames)
+    if not (0 <= frame_start < frame_end):
+        raise HTTPException(status_code=400, detail="Invalid frame range")
+
+    zones = get_zone_map(file_path, kind, index)
+    axes = {"x": [0], "y": [1]}.get(axis, [0, 1]) if kind == "slope" else [0]
+    candidates = zone_candidates(zones["min"][axes], zones["max"][axes], predicate, low, high).any(axis=0)
+
+    selected = np.zeros(num_indices, dtype=bool)
+    if indices is None:
+        selected[:] = True
+    else:
+        selected[indices] = True
+    selected_blocks = np.zeros(candidates.shape[1], dtype=bool)
+    selected_blocks[np.flatnonzero(selected) // INDEX_BLOCK] = True
+
+    first_block = frame_start // FRAME_BLOCK
+    last_block = -(-frame_end // FRAME_BLOCK)
+    candidates[:first_block] = False
+    candidates[last_block:] = False
+    candidates &= selected_blocks
+
+    frame_hits = np.zeros(frame_end - frame_start, dtype=bool)
+    index_hits = np.zeros(num_indices, dtype=bool)
+    match_count = 0
+    for block in np.flatnonzero(candidates.any(axis=1)):
+        start = max(block * FRAME_BLOCK, frame_start)
+        end = min((block + 1) * FRAME_BLOCK, frame_end)
+        index_blocks = np.flatnonzero(candidates[block])
+        lo = index_blocks[0] * INDEX_BLOCK
+        hi = min((index_blocks[-1] + 1) * INDEX_BLOCK, num_indices)
+        columns = selected[lo:hi] & np.repeat(candidates[block, index_blocks[0]:index_blocks[-1] + 1], INDEX_BLOCK)[:hi - lo]
+
+        values = read_tile(dataset, kind, index, start, end, lo, hi)[axes][:, :, columns]
+        hits = evaluate(values, predicate, low, high).any(axis=0)
+        match_count += int(hits.sum())
+        frame_hits[start - frame_start:end - frame_start] |= hits.any(axis=1)
+        index_hits[np.flatnonzero(columns)[hits.any(axis=0)] + lo] = True
+
+    return {
+        "frame_ranges": frame_ranges(frame_hits, frame_start),
+        "indices": np.flatnonzero(index_hits),
+        "matching_frames": int(frame_hits.sum()),
+        "match_count": match_count,
+        "blocks_total": int(selected_blocks.sum()) * (last_block - first_block),
+        "blocks_scanned": int(candidates.sum()),
+    }
+
+def search_payload(file_path: str, kind: str, form: Mapping) -> dict:
+    """
+    Shared body of the search routes: `predicate` compared against `value`, or against
+    [`value`, `value2`] for between/outside, over an optional frame range and `indices`
+    spec ("0-15,32"). Slopes are tested on the x, y or either component (`axis`).
+    """
+    predicate = form.get("predicate", "gt")
+    if predicate not in PREDICATES:
+        raise HTTPException(status_code=400, detail=f"Invalid predicate: {predicate}")
+    axis = form.get("axis", "any")
+    if axis not in SLOPE_AXES:
+        raise HTTPException(status_code=400, detail=f"Invalid axis: {axis}")
+    try:
+        index = int(form.get("index", 0))
+        low = float(form.get("value"))
+        high = float(form.get("value2")) if predicate in ("between", "outside") else low
+        frame_start = int(form.get("frame_start", 0))
+        frame_end = form.get("frame_end")
+        frame_end = int(frame_end) if frame_end not in (None, "") else None
+        max_ranges = int(form.get("max_ranges", 1000))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid search parameters")
+    if high < low:
+        raise HTTPException(status_code=400, detail="value2 must not be below value")
+
+    _, num_indices = open_dataset(file_path).extent(kind, index)
+    indices = parse_indices(form.get("indices"), num_indices) if form.get("indices") else None
+    result = search(file_path, kind, index, predicate, low, high, axis, frame_start, frame_end, indices)
+    result["truncated"] = len(result["frame_ranges"]) > max_ranges
+    result["frame_ranges"] = result["frame_ranges"][:max_ranges]
+    result["indices"] = result["indices"].tolist()
+    return result
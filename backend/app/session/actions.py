@@ -4,6 +4,7 @@ from uuid import UUID, uuid4
 from fastapi import Request
 
 from .manager import SessionData, session_store, SESSION_COOKIE_NAME
+from ..services.dataset_cache import evict_dataset
 
 # Function to get an existing session
 async def get_session_from_id(session_id: UUID) -> Optional[SessionData]:
@@ -37,6 +38,7 @@ async def delete_expired_sessions():
     for session_id, session in session_store.items():
         if session.is_expired():
             to_delete.append(session_id)
+            evict_dataset(session.file_path)
             try:
                 os.unlink(session.file_path)
             except Exception:
@@ -53,6 +55,7 @@ async def delete_single_session(session_id: UUID) -> bool:
         print(f"Session {session_id} does not exist or has already been cleaned.")
         return False
 
+    evict_dataset(session.file_path)
     try:
         os.unlink(session.file_path)
     except Exception:
@@ -65,6 +68,7 @@ async def delete_single_session(session_id: UUID) -> bool:
 async def update_session(session: SessionData, file_path: Optional[str] = None) -> None:
     session.update_timestamp()
     if file_path:
+        evict_dataset(session.file_path)
         os.unlink(session.file_path)
         session.update_file_path(file_path)
         print(f"Session updated with new file path: {file_path}")
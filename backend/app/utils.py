@@ -1,6 +1,5 @@
 from fastapi import HTTPException
 import numpy as np
-from astropy.visualization import MinMaxInterval, ZScaleInterval, PercentileInterval
 
 def get_scale(scale_type):
     match scale_type:
@@ -31,6 +30,9 @@ def get_scale(scale_type):
     return scale_func
 
 def get_interval(interval_type):
+    # astropy.visualization is slow to import and only needed here, so it loads on first use
+    from astropy.visualization import MinMaxInterval, ZScaleInterval, PercentileInterval
+
     match interval_type:
         case "minmax":
             return MinMaxInterval()
@@ -53,4 +55,38 @@ def process_frame(scale_type, interval_type, frame_data):
     scaled = scale_func(clipped)
     # scaled = scale_func(normalized)
     
-    return scaled
\ No newline at end of file
+    return scaled
+
+def nan_to_none(arr):
+    """
+    Convert an array to nested lists, replacing NaN with None so it serialises to JSON null.
+    """
+    arr = np.asarray(arr)
+    if arr.dtype.kind != "f":
+        return arr.tolist()
+    return np.where(np.isnan(arr), None, arr).tolist()
+
+def parse_indices(spec: str | None, num_indices: int) -> np.ndarray:
+    """
+    Flat indices from a comma separated list of indices and inclusive ranges,
+    e.g. "0-15,32"; every index when not given. Each range is checked against
+    `num_indices` before any array is built.
+    """
+    if spec in (None, ""):
+        return np.arange(num_indices)
+
+    bounds = []
+    try:
+        for part in spec.split(","):
+            start, _, end = part.strip().partition("-")
+            start = int(start)
+            end = int(end) if end else start
+            if end < start:
+                raise ValueError(part)
+            bounds.append((start, end))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid indices: {spec}")
+
+    if any(start < 0 or end >= num_indices for start, end in bounds):
+        raise HTTPException(status_code=400, detail=f"Indices out of range (0 to {num_indices - 1})")
+    return np.concatenate([np.arange(start, end + 1) for start, end in bounds])
@@ -0,0 +1,333 @@
+"""
+Local multi-user load test for the AOTrack backend.
+
+Starts the app with uvicorn, gives every simulated user its own session over a
+synthetic AOT file (or --file), and replays interaction traces concurrently.
+For each scenario (one trace file) it reports throughput, latency percentiles and
+error rates per step, and the server's memory growth as seen by /debug/memory.
+
+    cd backend
+    python tools/loadtest.py --users 16 --frames 5000 --trace tools/traces/viewing.json
+
+A trace is a JSON list of steps, run in order by every user:
+
+    {"name": "tiles", "method": "POST", "path": "/pixel/tile",
+     "form": {"frame_start": {"start": 0, "step": 256}, "frame_end": {"start": 256, "step": 256}},
+     "repeat": 16, "parallel": 4, "think": 0.0}
+
+- "upload": true instead of a path uploads the user's file and starts its session
+- "repeat" runs the request that many times; "parallel" spreads the repeats over
+  that many connections at once (a browser loading tiles); "think" sleeps between repeats
+- form values may be plain values, strings using {i} (repeat number) and {user},
+  {"start": a, "step": s} for a + i * s, {"cycle": [...]} or {"random": [low, high]}
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TRACE = os.path.join(BACKEND_DIR, "tools", "traces", "viewing.json")
+
+# Seconds between two samples of the server's memory
+MEMORY_SAMPLE_INTERVAL = 0.5
+STARTUP_TIMEOUT = 60.0
+
+def make_synthetic_file(path: str, frames: int, detector: tuple[int, int] = (64, 64), grid: int = 16, seed: int = 0) -> None:
+    """
+    Write a single-sensor, single-loop AOT file: Poisson detector frames, a circular
+    grid x grid subaperture mask with Gaussian slopes, and a DM with one Gaussian
+    influence function per subaperture position driven by random-walk commands.
+    """
+    import aotpy
+
+    # aotpy 2.0's FITS writer calls a numpy helper that numpy 2 removed
+    if not hasattr(np.char, "_get_num_chars"):
+        np.char._get_num_chars = lambda a: max(1, a.dtype.itemsize // 4 if a.dtype.kind == "U" else a.dtype.itemsize)
+
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[:grid, :grid]
+    centre = (grid - 1) / 2
+    valid = (yy - centre) ** 2 + (xx - centre) ** 2 <= (grid / 2) ** 2
+    mask = np.full((grid, grid), -1)
+    mask[valid] = np.arange(valid.sum())
+    n_sub = int(valid.sum())
+
+    size = grid * 4
+    axis = np.linspace(-1, 1, size)
+    y, x = np.meshgrid(axis, axis, indexing="ij")
+    pupil = x ** 2 + y ** 2 <= 1
+    centres = np.linspace(-1, 1, grid)[np.argwhere(valid)]
+    influence = np.exp(-((x[None] - centres[:, 1, None, None]) ** 2 + (y[None] - centres[:, 0, None, None]) ** 2) / (2 / grid) ** 2)
+    influence[:, ~pupil] = np.nan
+
+    telescope = aotpy.MainTelescope("TEL")
+    source = aotpy.NaturalGuideStar("NGS")
+    detector_frames = rng.poisson(100, size=(frames, *detector)).astype(np.float64)
+    sensor = aotpy.ShackHartmann(
+        "WFS", source=source, n_valid_subapertures=n_sub,
+        measurements=aotpy.Image("slopes", rng.normal(size=(frames, 2, n_sub))),
+        subaperture_mask=aotpy.Image("mask", mask),
+        detector=aotpy.Detector("DET", pixel_intensities=aotpy.Image("pixels", detector_frames)),
+    )
+    mirror = aotpy.DeformableMirror("DM", telescope=telescope, n_valid_actuators=n_sub, influence_function=aotpy.Image("influence", influence))
+    commands = np.cumsum(rng.normal(size=(frames, n_sub)), axis=0) * 0.01
+    loop = aotpy.ControlLoop("LOOP", commanded_corrector=mirror, input_sensor=sensor,
+                             commands=aotpy.Image("commands", commands), framerate=1000.0, delay=2.0)
+    system = aotpy.AOSystem(ao_mode="SCAO", main_telescope=telescope, sources=[source],
+                            wavefront_sensors=[sensor], wavefront_correctors=[mirror], loops=[loop])
+    system.write_to_file(path)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port: int) -> subprocess.Popen:
+    """
+    Run the app in a uvicorn subprocess and wait until /ready answers 200.
+    """
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/ready")
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Server did not become ready")
+
+class Client:
+    """
+    One simulated browser: keeps the session cookie and opens keep-alive connections.
+    """
+    def __init__(self, port: int):
+        self.port = port
+        self.cookies: dict[str, str] = {}
+        self._local = threading.local()
+
+    def connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=120)
+        return conn
+
+    def request(self, method: str, path: str, body: bytes | None = None, headers: dict | None = None) -> int:
+        headers = dict(headers or {})
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        for attempt in range(2):
+            reused = getattr(self._local, "conn", None) is not None
+            conn = self.connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                self._local.conn = None
+                # The server closes idle keep-alive connections; retry those once on a new one
+                if not reused or attempt:
+                    raise
+        for header, value in response.getheaders():
+            if header.lower() == "set-cookie":
+                name, _, rest = value.partition("=")
+                self.cookies[name.strip()] = rest.split(";", 1)[0]
+        return response.status
+
+    def upload(self, filename: str, content: bytes) -> int:
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+        return self.request("POST", "/upload", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+def resolve(value, i: int, user: int, rng: random.Random):
+    if isinstance(value, str):
+        return value.format(i=i, user=user)
+    if isinstance(value, dict):
+        if "cycle" in value:
+            return value["cycle"][i % len(value["cycle"])]
+        if "random" in value:
+            low, high = value["random"]
+            return rng.randrange(low, high)
+        if "start" in value:
+            return value["start"] + i * value.get("step", 0)
+        raise ValueError(f"Unknown form value {value}")
+    return value
+
+class Recorder:
+    """
+    Thread-safe latency and status log of one scenario, keyed by step name.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: dict[str, list[tuple[float, bool]]] = {}
+
+    def add(self, name: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.samples.setdefault(name, []).append((seconds, ok))
+
+def run_user(port: int, user: int, trace: list[dict], content: bytes, recorder: Recorder) -> None:
+    client = Client(port)
+    rng = random.Random(user)
+    for step in trace:
+        name = step.get("name", step.get("path", "upload"))
+        repeat = step.get("repeat", 1)
+
+        def one(i, step=step, name=name):
+            started = time.perf_counter()
+            try:
+                if step.get("upload"):
+                    status = client.upload(f"user-{user}.fits", content)
+                else:
+                    form = {key: resolve(value, i, user, rng) for key, value in step.get("form", {}).items()}
+                    method = step.get("method", "POST")
+                    if method == "GET":
+                        status = client.request("GET", f"{step['path']}?{urlencode(form)}" if form else step["path"])
+                    else:
+                        status = client.request(method, step["path"], urlencode(form).encode(),
+                                                {"Content-Type": "application/x-www-form-urlencoded"})
+                ok = status < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+            recorder.add(name, time.perf_counter() - started, ok)
+            if step.get("think"):
+                time.sleep(step["think"])
+
+        parallel = step.get("parallel", 1)
+        if parallel > 1:
+            with ThreadPoolExecutor(max_workers=parallel) as pool:
+                list(pool.map(one, range(repeat)))
+        else:
+            for i in range(repeat):
+                one(i)
+
+def server_rss(port: int) -> int | None:
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", "/debug/memory")
+        return json.loads(conn.getresponse().read())["rss_bytes"]
+    except (OSError, ValueError, KeyError, http.client.HTTPException):
+        return None
+
+def run_scenario(port: int, trace: list[dict], users: int, content: bytes) -> dict:
+    recorder = Recorder()
+    rss = [server_rss(port)]
+    done = threading.Event()
+
+    def sample_memory():
+        while not done.wait(MEMORY_SAMPLE_INTERVAL):
+            rss.append(server_rss(port))
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        for future in [pool.submit(run_user, port, user, trace, content, recorder) for user in range(users)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    rss.append(server_rss(port))
+
+    steps = {}
+    all_latencies, all_errors = [], 0
+    for name, samples in recorder.samples.items():
+        latencies = np.array([seconds for seconds, _ in samples]) * 1000
+        errors = sum(not ok for _, ok in samples)
+        all_latencies.extend(latencies)
+        all_errors += errors
+        steps[name] = summarise(latencies, errors, elapsed)
+    known = [value for value in rss if value is not None]
+    return {
+        "users": users,
+        "seconds": round(elapsed, 3),
+        "total": summarise(np.array(all_latencies), all_errors, elapsed),
+        "steps": steps,
+        "rss_start_mb": round(known[0] / 2**20, 1) if known else None,
+        "rss_peak_mb": round(max(known) / 2**20, 1) if known else None,
+        "rss_end_mb": round(known[-1] / 2**20, 1) if known else None,
+    }
+
+def summarise(latencies_ms: np.ndarray, errors: int, elapsed: float) -> dict:
+    count = len(latencies_ms)
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if count else (np.nan,) * 3
+    return {
+        "requests": count,
+        "throughput": round(count / elapsed, 1) if elapsed else None,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+    }
+
+def print_report(name: str, report: dict) -> None:
+    print(f"\n== {name}: {report['users']} users, {report['seconds']} s, "
+          f"RSS {report['rss_start_mb']} -> {report['rss_end_mb']} MiB (peak {report['rss_peak_mb']})")
+    print(f"{'step':<28}{'reqs':>7}{'req/s':>9}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for step, stats in [*report["steps"].items(), ("total", report["total"])]:
+        print(f"{step:<28}{stats['requests']:>7}{stats['throughput']:>9}{stats['error_rate'] * 100:>7.1f}"
+              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", action="append", help="trace file, once per scenario (default: viewing.json)")
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--frames", type=int, default=2000, help="frames in the synthetic file")
+    parser.add_argument("--file", help="AOT file to upload instead of a synthetic one")
+    parser.add_argument("--port", type=int, help="port for the server (default: a free one)")
+    parser.add_argument("--json", help="also write the reports to this file")
+    args = parser.parse_args()
+
+    path = args.file
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f"aotrack-loadtest-{args.frames}.fits")
+        if not os.path.exists(path):
+            print(f"Writing synthetic file with {args.frames} frames to {path}")
+            make_synthetic_file(path, args.frames)
+    with open(path, "rb") as f:
+        content = f.read()
+
+    port = args.port or free_port()
+    server = start_server(port)
+    reports = {}
+    try:
+        for trace_path in args.trace or [DEFAULT_TRACE]:
+            with open(trace_path) as f:
+                trace = json.load(f)
+            name = os.path.splitext(os.path.basename(trace_path))[0]
+            reports[name] = run_scenario(port, trace, args.users, content)
+            print_report(name, reports[name])
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+if __name__ == "__main__":
+    main()